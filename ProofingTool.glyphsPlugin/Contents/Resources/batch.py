@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+from datetime import datetime
+
+from fonts import OCCFontSource
+from schema import validate_template
+from pipeline import OCCProofingPipeline
+from profiling import OCCProofingProfile
+from store import OCCDiskCache
+from renderers import RENDERERS, get_overlay_text, get_overlay_lines, get_placeholder
+
+# US Letter, landscape, in drawBot points; the same canvas the tool proofs on.
+PAGE_WIDTH = 792.0
+PAGE_HEIGHT = 612.0
+
+# Everything a batch worker keeps warm across the templates it proofs: the font
+# source, its interpolated widths (in the pipeline's metrics) and outlines, and the
+# disk cache, which workers share with each other, and with later batches.
+WORKER = {}
+
+
+class OCCBatchGlyph(object):
+	# the one thing the layouts read from a glyph of the glyph sequence.
+	__slots__ = ('name',)
+
+	def __init__(self, name):
+		self.name = name
+
+
+def get_renderer(name):
+	if name == 'drawbot':
+		# only where DrawBot is installed.
+		from drawing import OCCDrawBotRenderer
+		return OCCDrawBotRenderer
+	return RENDERERS[name]
+
+
+def init_worker(font_paths, cache_path, cache_limit, renderer_name):
+	source = OCCFontSource(font_paths)
+	disk_cache = None
+	if cache_path is not None:
+		try:
+			disk_cache = OCCDiskCache(cache_path, source.identity, cache_limit)
+		except Exception as error:
+			print('[disk cache] couldn’t open the disk cache, continuing without it: %s' % error)
+	profile = OCCProofingProfile(enabled=True)
+	WORKER['source'] = source
+	WORKER['disk_cache'] = disk_cache
+	WORKER['profile'] = profile
+	WORKER['pipeline'] = OCCProofingPipeline(profile, disk_cache)
+	WORKER['outlines'] = {}
+	WORKER['renderer'] = get_renderer(renderer_name)
+
+
+def get_parameters(template, source, fallback):
+	# the parameters the tool would proof a template with, once it's selected.
+	proof = template['proof']
+	instances = [line['style'] for line in template['lines']]
+	return {
+		'gaps': {
+			'left': proof['margins']['left'],
+			'right': proof['margins']['right'],
+			'top': proof['margins']['top'],
+			'bottom': proof['margins']['bottom'],
+			'line': proof['gaps']['line'],
+			'block': proof['gaps']['block']
+		},
+		'instances': instances,
+		'exports': dict((style_name, source.styles[style_name]) for style_name in instances),
+		'export_keys': dict((style_name, source.styles[style_name].key) for style_name in instances),
+		'stamps': {},
+		'fallback': fallback,
+		'point_sizes': [line['size'] for line in template['lines']],
+		'aligned': True,
+		'document': {'width': 11, 'height': 8.5},
+		'title': template['name'],
+		'footer': proof['footer'],
+		'mode': proof['mode']
+	}
+
+
+def get_glyphs(template, source):
+	glyphs = []
+	for glyph_name in template['glyphs']:
+		if glyph_name == 'newGlyph':
+			glyphs.append(OCCBatchGlyph('newGlyph'))
+		else:
+			glyphs.append(OCCBatchGlyph(source.resolve(glyph_name)))
+	return [glyphs]
+
+
+def get_outline_getter(layout, parameters):
+	# get_outline(style_id, glyph_id) for the renderers, from the worker's outlines, the
+	# disk cache, or else the font, in that order.
+	source = WORKER['source']
+	disk_cache = WORKER['disk_cache']
+	outlines = WORKER['outlines']
+	metrics = layout.metrics
+
+	def get_outline(style_id, glyph_id):
+		style_name = layout.style_names[style_id]
+		glyph_name = metrics.sources[style_name][glyph_id]
+		if glyph_name is None:
+			return get_placeholder(metrics.get_width(style_name, glyph_id), source.upm)
+		style = parameters['exports'][style_name]
+		key = (style.key, glyph_name)
+		outline = outlines.get(key)
+		if outline is None:
+			if disk_cache is not None:
+				outline = disk_cache.get_outline(style.key, glyph_name, None)
+			if outline is None:
+				outline = style.get_outline(glyph_name)
+				if disk_cache is not None:
+					disk_cache.set_outline(style.key, glyph_name, None, *outline)
+			outlines[key] = outline
+		return outline if len(outline[0]) > 0 else None
+
+	return get_outline
+
+
+def proof_template(template_path, output_directory, fallback='.notdef', debug=False):
+	# Proof one template file in this worker, and return how it went, with its timings.
+	# messages are prefixed with the template's path, like validate_template's.
+	source = WORKER['source']
+	profile = WORKER['profile']
+	pipeline = WORKER['pipeline']
+	disk_cache = WORKER['disk_cache']
+	renderer_class = WORKER['renderer']
+	messages = []
+
+	profile.start({'template': template_path, 'font': source.paths})
+	if disk_cache is not None:
+		disk_cache.reset_counters()
+	try:
+		with open(template_path, 'r') as template_file:
+			template = json.load(template_file)
+		template = validate_template(template_path, template, source.styles.keys(), source.has_glyph, debug, messages)
+		parameters = get_parameters(template, source, fallback)
+		glyphs = get_glyphs(template, source)
+
+		layout = pipeline.layout(glyphs, parameters, PAGE_WIDTH, PAGE_HEIGHT, source.upm)
+		missing = layout.metrics.get_missing()
+		if len(missing) > 0:
+			messages.append('[%s]\t%d glyphs are missing from some styles, and are drawn as %s' % (template_path, len(missing), fallback if fallback != '' else 'a placeholder box'))
+
+		stem = os.path.splitext(os.path.basename(template_path))[0]
+		output_path = os.path.join(output_directory, stem + renderer_class.extension)
+		text = get_overlay_text(parameters, datetime.now())
+		renderer = renderer_class(PAGE_WIDTH, PAGE_HEIGHT)
+		with profile.stage('render'):
+			page_count = renderer.render(
+				layout,
+				get_outline_getter(layout, parameters),
+				output_path,
+				overlay=lambda page_number: get_overlay_lines(parameters, text, PAGE_WIDTH, page_number))
+		profile.count('pages', page_count)
+		profile.count('placements', sum(map(len, layout.get())))
+	finally:
+		if disk_cache is not None:
+			disk_cache.commit()
+		run = profile.stop()
+
+	if disk_cache is not None:
+		messages.append('[%s]\t%s' % (template_path, disk_cache.report()))
+	return {
+		'template': template_path,
+		'name': template['name'],
+		'outputs': renderer.outputs,
+		'messages': messages,
+		'run': run
+	}
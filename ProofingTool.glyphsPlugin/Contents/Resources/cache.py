@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+
+class OCCOutlineCache(object):
+	# Unscaled glyph outlines, built once per (style, glyph) and reused for every
+	# placement of that glyph through a transform. An entry only stays valid while
+	# its glyph's change stamp is unchanged; a newer stamp replaces the old outline.
+
+	def __init__(self):
+		self.outlines = {}
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, style_name, glyph_name, change_stamp):
+		entry = self.outlines.get((style_name, glyph_name))
+		if entry is not None and entry[0] == change_stamp:
+			self.hits += 1
+			return entry[1]
+		self.misses += 1
+		return None
+
+	def set(self, style_name, glyph_name, change_stamp, outline):
+		self.outlines[(style_name, glyph_name)] = (change_stamp, outline)
+		return outline
+
+	def clear(self):
+		self.outlines = {}
+		self.reset_counters()
+
+	def reset_counters(self):
+		self.hits = 0
+		self.misses = 0
+
+	def report(self):
+		return '[outlines] %d hits, %d misses, %d cached' % (self.hits, self.misses, len(self.outlines))
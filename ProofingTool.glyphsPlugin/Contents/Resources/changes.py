@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+
+class OCCChangeTracker(object):
+	# Change stamps for the glyphs in a proof. A glyph's stamp covers its own last
+	# change, and the stamps of the glyphs it uses as components, so a composite
+	# counts as changed when one of its components was edited. Every cache keyed
+	# on these stamps then drops only the entries of glyphs that actually changed.
+
+	def __init__(self):
+		# component names per glyph, as of the glyph's last change.
+		self.components = {}
+
+	def get_stamps(self, font, glyph_names):
+		stamps = {}
+		for glyph_name in glyph_names:
+			if glyph_name != 'newGlyph':
+				self.get_stamp(font, glyph_name, stamps)
+		return stamps
+
+	def get_stamp(self, font, glyph_name, stamps):
+		if glyph_name in stamps:
+			return stamps[glyph_name]
+		# guards against components that refer back to the glyph.
+		stamps[glyph_name] = None
+
+		glyph = font.glyphs[glyph_name]
+		if glyph is None:
+			return None
+
+		last_change = glyph.lastChange
+		entry = self.components.get(glyph_name)
+		if entry is None or entry[0] != last_change:
+			# components are only read again when the glyph itself was edited.
+			component_names = set()
+			for layer in glyph.layers:
+				for component in layer.components:
+					component_names.add(component.componentName)
+			entry = (last_change, tuple(sorted(component_names)))
+			self.components[glyph_name] = entry
+
+		stamp = (last_change, tuple(self.get_stamp(font, component_name, stamps) for component_name in entry[1]))
+		stamps[glyph_name] = stamp
+		return stamp
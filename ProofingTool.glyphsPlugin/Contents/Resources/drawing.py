@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from array import array
+from AppKit import NSMoveToBezierPathElement, NSLineToBezierPathElement, NSCurveToBezierPathElement, NSClosePathBezierPathElement
+from Foundation import NSURL
+from Quartz import (
+	CGRectMake,
+	CGPDFContextCreateWithURL,
+	CGPDFContextClose,
+	CGContextBeginPage,
+	CGContextEndPage,
+	CGContextSaveGState,
+	CGContextRestoreGState,
+	CGContextTranslateCTM,
+	CGContextBeginPath,
+	CGContextMoveToPoint,
+	CGContextAddLineToPoint,
+	CGContextAddCurveToPoint,
+	CGContextClosePath,
+	CGContextFillPath
+)
+from drawBot.drawBotDrawingTools import _drawBotDrawingTool
+from drawBot.context.drawBotContext import DrawBotContext
+
+from store import MOVE_TO, LINE_TO, CURVE_TO, CLOSE_PATH, OPERATION_POINTS
+from renderers import OCCRenderer, get_outline_bounds
+from profiling import OCCProofingProfile
+
+GLYPH_SHEET_SIZE = 256  # outlines per glyph sheet, see OCCDrawBotRenderer
+
+BEZIER_OPERATIONS = {
+	NSMoveToBezierPathElement: MOVE_TO,
+	NSLineToBezierPathElement: LINE_TO,
+	NSCurveToBezierPathElement: CURVE_TO,
+	NSClosePathBezierPathElement: CLOSE_PATH
+}
+
+
+def flattenBezierPath(bezierPath):
+	# An NSBezierPath as the (operations, coordinates) the disk cache stores,
+	# or None for a path with elements the cache can't store.
+	operations = bytearray()
+	coordinates = array('f')
+	for index in range(bezierPath.elementCount()):
+		element, points = bezierPath.elementAtIndex_associatedPoints_(index)
+		if element not in BEZIER_OPERATIONS:
+			return None
+		operation = BEZIER_OPERATIONS[element]
+		operations.append(operation)
+		for point in points[:OPERATION_POINTS[operation]]:
+			coordinates.append(point.x)
+			coordinates.append(point.y)
+	return operations, coordinates
+
+
+def fillOutline(context, operations, coordinates):
+	# fill an outline into a Quartz context, as drawBot's drawPath would: in black, non-zero winding.
+	CGContextBeginPath(context)
+	index = 0
+	for operation in operations:
+		if operation == MOVE_TO:
+			CGContextMoveToPoint(context, coordinates[index], coordinates[index + 1])
+		elif operation == LINE_TO:
+			CGContextAddLineToPoint(context, coordinates[index], coordinates[index + 1])
+		elif operation == CURVE_TO:
+			CGContextAddCurveToPoint(
+				context,
+				coordinates[index], coordinates[index + 1],
+				coordinates[index + 2], coordinates[index + 3],
+				coordinates[index + 4], coordinates[index + 5])
+		else:
+			CGContextClosePath(context)
+		index += 2 * OPERATION_POINTS[operation]
+	CGContextFillPath(context)
+
+
+class OCCDrawBotRenderer(OCCRenderer):
+	# Renders through DrawBot, inside Glyphs or anywhere else DrawBot runs. Every
+	# outline is drawn once, as a page of a glyph sheet pdf, and each placement draws
+	# that page through a transform, which pdf writers keep as a single form object
+	# for the whole document.
+	#
+	# A sheet holds the outlines of up to GLYPH_SHEET_SIZE consecutive glyphs of a
+	# style. Sheets are drawn with Quartz, outside of DrawBot's drawing, as the first
+	# page that places one of their outlines is about to be drawn, so the time to the
+	# first page only depends on the glyphs on it. They're kept in `directory` for as
+	# long as the renderer is: given the versions of the outlines, a later render only
+	# draws the sheets with a changed outline again. Without a directory, sheets only
+	# last for one render.
+	#
+	# Pages are kept too, by a hash of their content (see OCCProofingLayout.get_page_hash),
+	# as display lists: where each sheet page goes on the page. A page with the hash of
+	# one drawn in the last render replays its display list, rather than being drawn
+	# from its placements again, as long as the sheets it places are still current; only
+	# the overlay is stamped anew. Pages are only kept when versions are given.
+	#
+	# With a path of None, the document is kept in memory, as `document`. Writing the
+	# document, or a snapshot of it, is timed as the profile's pdf stage.
+	extension = '.pdf'
+
+	def __init__(self, width, height, directory=None, profile=None):
+		OCCRenderer.__init__(self, width, height)
+		self.directory = directory
+		self.profile = profile if profile is not None else OCCProofingProfile()
+		self.scratch_directory = None
+		self.sheets = {}
+		self.sheet_count = 0
+		self.sheets_drawn = 0
+		# the paths of the sheets in self.sheets, which kept pages can place.
+		self.live_sheets = set()
+		# sheets replaced during a render, which its pages may still place until it ends.
+		self.retired = []
+		# display lists by page hash, of this render, and of the last one.
+		self.pages = {}
+		self.last_pages = {}
+		self.pages_reused = 0
+		self.layout = None
+		self.versions = None
+		self.check = None
+		self.path = None
+		self.document = None
+
+	def prepare(self, layout, get_outline, versions=None, check=None):
+		# nothing is drawn ahead of the pages: render_page brings the sheets a page needs up to date.
+		if self.directory is None:
+			self.scratch_directory = tempfile.mkdtemp(prefix='ProofingTool-sheets-')
+			self.sheets = {}
+			self.live_sheets = set()
+		self.layout = layout
+		self.versions = versions
+		self.check = check
+		self.sheets_drawn = 0
+		self.pages_reused = 0
+		if len(self.pages) > 0:
+			self.last_pages = self.pages
+			self.pages = {}
+		return {}
+
+	def render_page(self, page, handles, get_outline, page_number, overlay=None):
+		page_hash = self.layout.get_page_hash(page, self.versions) if self.versions is not None else None
+		display = self.pages.get(page_hash, self.last_pages.get(page_hash)) if page_hash is not None else None
+		if display is not None and all(sheet_path in self.live_sheets for sheet_path in display[0]):
+			self.pages_reused += 1
+		else:
+			for style_id, glyph_id in set(zip(page.style_ids, page.glyph_ids)):
+				if (style_id, glyph_id) not in handles:
+					self.update_sheet(style_id, glyph_id - glyph_id % GLYPH_SHEET_SIZE, handles, get_outline)
+			display = self.get_display(page, handles)
+		if page_hash is not None:
+			self.pages[page_hash] = display
+		self.begin_page()
+		self.replay(display)
+		self.stamp(overlay, page_number)
+		self.end_page()
+
+	def get_display(self, page, handles):
+		# A page's display list: the sheets it places, and for each placement, the index of
+		# its sheet, the sheet page, and the transform it's placed through.
+		sheet_ids = {}
+		sheet_indices = array('i')
+		page_numbers = array('i')
+		xs = array('d')
+		ys = array('d')
+		scales = array('d')
+		for glyph_id, style_id, x, y, scale in page.placements():
+			handle = handles[(style_id, glyph_id)]
+			if handle is None:
+				continue
+			sheet_path, page_number, x_offset, y_offset = handle
+			sheet_indices.append(sheet_ids.setdefault(sheet_path, len(sheet_ids)))
+			page_numbers.append(page_number)
+			xs.append(x + x_offset * scale)
+			ys.append(y + y_offset * scale)
+			scales.append(scale)
+		return tuple(sorted(sheet_ids, key=sheet_ids.get)), sheet_indices, page_numbers, xs, ys, scales
+
+	def replay(self, display):
+		sheet_paths, sheet_indices, page_numbers, xs, ys, scales = display
+		for sheet_index, page_number, x, y, scale in zip(sheet_indices, page_numbers, xs, ys, scales):
+			with _drawBotDrawingTool.savedState():
+				_drawBotDrawingTool.translate(x, y)
+				_drawBotDrawingTool.scale(scale)
+				_drawBotDrawingTool.image(sheet_paths[sheet_index], (0, 0), pageNumber=page_number)
+
+	def update_sheet(self, style_id, start, handles, get_outline):
+		# The handles of the outlines on one sheet, which is drawn again first if any of
+		# them changed since it was drawn.
+		layout = self.layout
+		style_name = layout.style_names[style_id]
+		end = min(start + GLYPH_SHEET_SIZE, len(layout.glyph_names))
+		key = (tuple(layout.glyph_names[start:end]), tuple(self.versions[style_id][start:end])) if self.versions is not None else None
+		entry = self.sheets.get((style_name, start))
+		if entry is None or key is None or entry[0] != key:
+			if self.check is not None:
+				self.check()
+			if entry is not None and entry[1] is not None:
+				self.live_sheets.discard(entry[1])
+				self.retired.append(entry[1])
+			directory = self.directory if self.directory is not None else self.scratch_directory
+			entry = (key,) + self.draw_sheet(directory, [get_outline(style_id, glyph_id) for glyph_id in range(start, end)])
+			self.sheets[(style_name, start)] = entry
+			if entry[1] is not None:
+				self.live_sheets.add(entry[1])
+			self.sheets_drawn += 1
+		for index, placement in enumerate(entry[2]):
+			handles[(style_id, start + index)] = placement
+
+	def draw_sheet(self, directory, outlines):
+		# One page per outline, just big enough to hold it, with the outline's bottom left
+		# corner at the page origin. Returns the sheet's path, and where each outline went,
+		# as (sheet path, page number, x, y), or None for an empty outline.
+		self.sheet_count += 1
+		sheet_path = os.path.join(directory, 'sheet-%d.pdf' % self.sheet_count)
+		placements = []
+		page_number = 0
+		context = None
+		try:
+			for outline in outlines:
+				bounds = get_outline_bounds(*outline) if outline is not None else None
+				if bounds is None:
+					placements.append(None)
+					continue
+				if context is None:
+					context = CGPDFContextCreateWithURL(NSURL.fileURLWithPath_(sheet_path), CGRectMake(0, 0, 1, 1), None)
+				x_min, y_min, x_max, y_max = bounds
+				CGContextBeginPage(context, CGRectMake(0, 0, max(1, x_max - x_min), max(1, y_max - y_min)))
+				CGContextSaveGState(context)
+				CGContextTranslateCTM(context, -x_min, -y_min)
+				fillOutline(context, *outline)
+				CGContextRestoreGState(context)
+				CGContextEndPage(context)
+				page_number += 1
+				placements.append((sheet_path, page_number, x_min, y_min))
+		finally:
+			if context is not None:
+				CGPDFContextClose(context)
+		return (sheet_path if page_number > 0 else None), placements
+
+	def begin(self, path):
+		self.path = path
+		self.outputs = [path] if path is not None else []
+		self.document = None
+		_drawBotDrawingTool.newDrawing()
+
+	def begin_page(self):
+		_drawBotDrawingTool.newPage(self.width, self.height)
+		_drawBotDrawingTool.fill(1, 1, 1)
+		_drawBotDrawingTool.rect(0, 0, self.width, self.height)
+		_drawBotDrawingTool.fill(0, 0, 0)
+
+	def text(self, text, x, y, size, gray):
+		with _drawBotDrawingTool.savedState():
+			_drawBotDrawingTool.fontSize(size)
+			_drawBotDrawingTool.fill(gray, gray, gray)
+			_drawBotDrawingTool.text(text, (x, y))
+
+	def end_page(self):
+		pass
+
+	def snapshot(self):
+		# the pages drawn so far, as a pdf document. the drawing itself carries on.
+		with self.profile.stage('pdf'):
+			context = DrawBotContext()
+			_drawBotDrawingTool._drawInContext(context)
+			return context.getNSPDFDocument()
+
+	def end(self):
+		try:
+			if self.path is not None:
+				with self.profile.stage('pdf'):
+					_drawBotDrawingTool.saveImage(self.path)
+			else:
+				self.document = self.snapshot()
+		finally:
+			self.close()
+
+	def abort(self):
+		self.close()
+
+	def close(self):
+		_drawBotDrawingTool.endDrawing()
+		for sheet_path in self.retired:
+			if os.path.exists(sheet_path):
+				os.remove(sheet_path)
+		self.retired = []
+		if self.scratch_directory is not None:
+			shutil.rmtree(self.scratch_directory, ignore_errors=True)
+			self.scratch_directory = None
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import os
+from array import array
+
+from fontTools.ttLib import TTFont
+from fontTools.pens.basePen import BasePen
+
+from store import MOVE_TO, LINE_TO, CURVE_TO, CLOSE_PATH, get_token
+
+MASTER_ID = 'master'
+
+
+class OCCFlatteningPen(BasePen):
+	# Records an outline as the (operations, coordinates) the disk cache and the
+	# renderers take. quadratic curves come out as cubics, and components decomposed.
+
+	def __init__(self, glyph_set):
+		BasePen.__init__(self, glyph_set)
+		self.operations = bytearray()
+		self.coordinates = array('f')
+
+	def add(self, operation, *points):
+		self.operations.append(operation)
+		for x, y in points:
+			self.coordinates.append(x)
+			self.coordinates.append(y)
+
+	def _moveTo(self, point):
+		self.add(MOVE_TO, point)
+
+	def _lineTo(self, point):
+		self.add(LINE_TO, point)
+
+	def _curveToOne(self, point1, point2, point3):
+		self.add(CURVE_TO, point1, point2, point3)
+
+	def _closePath(self):
+		self.add(CLOSE_PATH)
+
+	def _endPath(self):
+		# open contours are filled as if they were closed.
+		self.add(CLOSE_PATH)
+
+
+class OCCFontMaster(object):
+	def __init__(self, ascender, descender):
+		self.id = MASTER_ID
+		self.ascender = ascender
+		self.descender = descender
+
+
+class OCCFontLayer(object):
+	def __init__(self, parent, width):
+		self.parent = parent
+		self.width = width
+
+
+class OCCFontGlyph(object):
+	def __init__(self, name, width):
+		self.name = name
+		self.layers = {MASTER_ID: OCCFontLayer(self, width)}
+
+
+class OCCFontGlyphs(object):
+	# the glyphs of one style, looked up by name like an interpolated font's glyphs.
+
+	def __init__(self, style):
+		self.style = style
+		self.glyphs = {}
+
+	def __contains__(self, glyph_name):
+		return glyph_name in self.style.glyph_names
+
+	def __getitem__(self, glyph_name):
+		glyph = self.glyphs.get(glyph_name)
+		if glyph is None:
+			glyph = OCCFontGlyph(glyph_name, self.style.get_glyph_set()[glyph_name].width)
+			self.glyphs[glyph_name] = glyph
+		return glyph
+
+
+class OCCFontStyle(object):
+	# One style of a compiled font, standing in for an interpolated Glyphs instance:
+	# it has a single master, and glyphs with a single layer each, so the layouts
+	# read it the same way. A named instance of a variable font is its location.
+
+	def __init__(self, font, path, name, location=None):
+		self.font = font
+		self.path = path
+		self.name = name
+		self.location = location
+		self.upm = font['head'].unitsPerEm
+		if 'OS/2' in font:
+			self.masters = [OCCFontMaster(font['OS/2'].sTypoAscender, font['OS/2'].sTypoDescender)]
+		else:
+			self.masters = [OCCFontMaster(font['hhea'].ascent, font['hhea'].descent)]
+		self.glyph_names = set(font.getGlyphOrder())
+		self.glyphs = OCCFontGlyphs(self)
+		self.glyph_set = None
+		# identifies the style's outlines in the disk cache.
+		self.key = (os.path.abspath(path), tuple(sorted(location.items())) if location is not None else ())
+
+	def get_glyph_set(self):
+		if self.glyph_set is None:
+			self.glyph_set = self.font.getGlyphSet(location=self.location, normalized=False) if self.location is not None else self.font.getGlyphSet()
+		return self.glyph_set
+
+	def get_outline(self, glyph_name):
+		glyph_set = self.get_glyph_set()
+		pen = OCCFlatteningPen(glyph_set)
+		glyph_set[glyph_name].draw(pen)
+		return pen.operations, pen.coordinates
+
+
+class OCCFontSource(object):
+	# The styles of one or more compiled fonts, read with fontTools, by the names a
+	# template's lines use: a variable font contributes each of its named instances,
+	# and a static font the style it is.
+
+	def __init__(self, paths):
+		self.paths = [os.path.abspath(path) for path in paths]
+		self.styles = {}
+		self.cmap = {}
+		self.glyph_names = set()
+		self.upm = None
+		for path in self.paths:
+			self.add_font(path)
+		# changes whenever one of the fonts does, which is all the disk cache needs to know.
+		stats = [(path, os.stat(path)) for path in self.paths]
+		self.identity = get_token(tuple((path, stat.st_mtime_ns, stat.st_size) for path, stat in stats))
+
+	def add_font(self, path):
+		font = TTFont(path, lazy=True)
+		if self.upm is None:
+			self.upm = font['head'].unitsPerEm
+		self.glyph_names.update(font.getGlyphOrder())
+		cmap = font.getBestCmap()
+		if cmap is not None:
+			for codepoint, glyph_name in cmap.items():
+				self.cmap.setdefault(codepoint, glyph_name)
+
+		names = font['name']
+		if 'fvar' in font:
+			for instance in font['fvar'].instances:
+				name = names.getDebugName(instance.subfamilyNameID)
+				self.styles[name] = OCCFontStyle(font, path, name, dict(instance.coordinates))
+		else:
+			name = names.getDebugName(17) or names.getDebugName(2)
+			self.styles[name] = OCCFontStyle(font, path, name)
+
+	def resolve(self, glyph_name):
+		# a glyph name, or a single character, as the glyph name it stands for; None if there's none.
+		if glyph_name in self.glyph_names:
+			return glyph_name
+		if len(glyph_name) == 1:
+			return self.cmap.get(ord(glyph_name))
+		return None
+
+	def has_glyph(self, glyph_name):
+		return self.resolve(glyph_name) is not None
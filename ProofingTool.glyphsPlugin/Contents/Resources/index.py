@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+
+class OCCGlyphIndex(object):
+	# The glyphs of a font by name, by unicode, and in buckets by category,
+	# subcategory and script, so templates and glyph sets resolve their glyphs
+	# without scanning the whole font.
+	#
+	# The index is built once, and kept current as the font changes: a glyph is
+	# filed again when it's looked up after its last change, and the font is only
+	# walked again, to pick up the glyphs added or removed, when its glyph count
+	# differs from the index's.
+
+	def __init__(self, font):
+		self.font = font
+		self.names = {}
+		self.unicodes = {}
+		self.buckets = {}
+		# per glyph name, the (last change, unicodes, bucket keys) it was filed under.
+		self.filed = {}
+		self.order = {}
+		self.count = 0
+		self.update()
+
+	def get_bucket_keys(self, glyph):
+		return (('category', glyph.category), ('sub_category', glyph.subCategory), ('script', glyph.script))
+
+	def get_unicodes(self, glyph):
+		unicodes = glyph.unicodes
+		return tuple(unicodes) if unicodes is not None else ()
+
+	def file_glyph(self, glyph):
+		name = glyph.name
+		self.unfile_glyph(name)
+		unicodes = self.get_unicodes(glyph)
+		bucket_keys = self.get_bucket_keys(glyph)
+		self.names[name] = glyph
+		for unicode in unicodes:
+			self.unicodes[unicode] = name
+		for bucket_key in bucket_keys:
+			self.buckets.setdefault(bucket_key, set()).add(name)
+		self.filed[name] = (glyph.lastChange, unicodes, bucket_keys)
+
+	def unfile_glyph(self, name):
+		filed = self.filed.pop(name, None)
+		if filed is None:
+			return
+		del self.names[name]
+		for unicode in filed[1]:
+			if self.unicodes.get(unicode) == name:
+				del self.unicodes[unicode]
+		for bucket_key in filed[2]:
+			self.buckets[bucket_key].discard(name)
+
+	def update(self):
+		# Walk the font once, filing only the glyphs that are new or changed since they
+		# were filed, and dropping the ones that are gone.
+		seen = set()
+		order = {}
+		for position, glyph in enumerate(self.font.glyphs):
+			name = glyph.name
+			seen.add(name)
+			order[name] = position
+			filed = self.filed.get(name)
+			if filed is None or filed[0] != glyph.lastChange:
+				self.file_glyph(glyph)
+		for name in [name for name in self.filed if name not in seen]:
+			self.unfile_glyph(name)
+		self.order = order
+		self.count = len(order)
+
+	def refresh(self):
+		# cheap enough to call before every use; only glyphs added or removed need a walk.
+		if len(self.font.glyphs) != self.count:
+			self.update()
+
+	def get_glyph(self, name):
+		glyph = self.names.get(name)
+		if glyph is not None and glyph.name == name:
+			if self.filed[name][0] != glyph.lastChange:
+				self.file_glyph(glyph)
+			return glyph
+		# renamed since it was filed, or not in the index yet.
+		if glyph is not None:
+			self.unfile_glyph(name)
+		if len(name) == 1:
+			# like the font's own lookup, a single character stands for the glyph it encodes.
+			glyph = self.get_glyph_for_unicode('%04X' % ord(name))
+			if glyph is not None:
+				return glyph
+		glyph = self.font.glyphs[name]
+		if glyph is not None:
+			self.file_glyph(glyph)
+		return glyph
+
+	def has_glyph(self, name):
+		return self.get_glyph(name) is not None
+
+	def get_glyph_for_unicode(self, unicode):
+		name = self.unicodes.get(unicode)
+		if name is None:
+			return None
+		glyph = self.get_glyph(name)
+		if glyph is None or unicode not in self.filed[glyph.name][1]:
+			return None
+		return glyph
+
+	def get_glyphs(self, category=None, sub_category=None, script=None):
+		# the glyphs in all the given buckets, in font order.
+		bucket_keys = [bucket_key for bucket_key in (('category', category), ('sub_category', sub_category), ('script', script)) if bucket_key[1] is not None]
+		if len(bucket_keys) == 0:
+			names = set(self.names)
+		else:
+			buckets = sorted((self.buckets.get(bucket_key, set()) for bucket_key in bucket_keys), key=len)
+			names = set(buckets[0]).intersection(*buckets[1:])
+		glyphs = []
+		for name in names:
+			glyph = self.get_glyph(name)
+			# filed again on lookup if it changed, which may have moved it out of the bucket.
+			if glyph is not None and all(bucket_key in self.filed[glyph.name][2] for bucket_key in bucket_keys):
+				glyphs.append(glyph)
+		return self.sort_glyphs(glyphs)
+
+	def sort_glyphs(self, glyphs):
+		last = len(self.order)
+		return sorted(glyphs, key=lambda glyph: self.order.get(glyph.name, last))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+# The number of interpolated proxies held at once, unless configured otherwise.
+DEFAULT_INTERPOLATION_CACHE_SIZE = 8
+
+
+def get_masters_fingerprint(font):
+	# the masters an interpolated proxy interpolates between, with everything about them
+	# that interpolates besides the glyphs: axis values, vertical metrics and alignment zones.
+	return tuple((master.id, tuple(master.axes), get_master_metrics(master), get_master_zones(master)) for master in font.masters)
+
+
+def get_master_metrics(master):
+	return tuple((metric.position, metric.overshoot) for metric in master.metrics)
+
+
+def get_master_zones(master):
+	return tuple((zone.position, zone.size) for zone in master.alignmentZones)
+
+
+class OCCInterpolationCache(object):
+	# Interpolated font proxies, keyed on the instance's axis values and a
+	# fingerprint of the masters. An entry whose key no longer matches is stale and
+	# interpolated again; the least recently used entries are dropped once more
+	# than `limit` styles are held.
+	#
+	# Each entry also remembers the change stamps of the glyphs it interpolated.
+	# When one of those glyphs was edited, the entry gets a fresh proxy, which is
+	# cheap: proxies only interpolate the glyphs that are looked up in them, and
+	# the proof's caches only look up the glyphs that changed.
+
+	def __init__(self, limit=DEFAULT_INTERPOLATION_CACHE_SIZE):
+		self.limit = max(1, int(limit))
+		self.proxies = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.refreshes = 0
+		self.evictions = 0
+
+	def get_key(self, instance, fingerprint):
+		return (tuple(instance.axes), fingerprint)
+
+	def get(self, style_name, instance, fingerprint, stamps):
+		key = self.get_key(instance, fingerprint)
+		entry = self.proxies.get(style_name)
+		if entry is not None and entry[0] == key:
+			key, proxy, known_stamps = entry
+			if any(glyph_name in known_stamps and known_stamps[glyph_name] != stamp for glyph_name, stamp in stamps.items()):
+				self.refreshes += 1
+				proxy = self.interpolate(instance)
+			else:
+				self.hits += 1
+			known_stamps.update(stamps)
+			self.proxies[style_name] = (key, proxy, known_stamps)
+			self.proxies.move_to_end(style_name)
+			return proxy
+
+		self.misses += 1
+		proxy = self.interpolate(instance)
+		self.proxies[style_name] = (key, proxy, dict(stamps))
+		self.proxies.move_to_end(style_name)
+		while len(self.proxies) > self.limit:
+			self.proxies.popitem(last=False)
+			self.evictions += 1
+		return proxy
+
+	def interpolate(self, instance):
+		# NOTE(nic): trying out `interpolatedFontProxy` here instead of `interpolatedFont`.
+		# accoding to [the docs](https://docu.glyphsapp.com/#GSInstance.interpolatedFontProxy),
+		# iterpolatedFontProxy interpolates glyphs on demand, rather than interpolating the entire instance.
+		# This means we do work proportional to the glyphs in the proof, rather than in the font.
+		return instance.interpolatedFontProxy
+
+	def invalidate(self, style_name=None):
+		if style_name is None:
+			self.proxies.clear()
+		else:
+			self.proxies.pop(style_name, None)
+
+	def reset_counters(self):
+		self.hits = 0
+		self.misses = 0
+		self.refreshes = 0
+		self.evictions = 0
+
+	def report(self):
+		return '[interpolation] %d hits, %d interpolated, %d refreshed for edits, %d evicted, %d cached' % (self.hits, self.misses, self.refreshes, self.evictions, len(self.proxies))
@@ -1,13 +1,248 @@
 # -*- coding: utf-8 -*-
 
-from pstats import Stats
+import math
+import hashlib
+from array import array
+
+from profiling import OCCProofingProfile
 
-PROFILE = False
 SPACE = 1000
+LINE_BREAK = -1  # marks a 'newGlyph' linebreak in a resolved glyph sequence
+UNFETCHED = object()  # marks a layer or width that hasn't been looked up yet
+PLACEHOLDER_WIDTH = 0.6  # in ems, the advance of the placeholder drawn for a glyph a style doesn't have
+
+
+class OCCProofingPage(object):
+	# The placements on a single page, held as parallel arrays rather than
+	# one dict per glyph. glyph and style ids index into the layout's
+	# glyph_names and style_names.
+	__slots__ = ('glyph_ids', 'style_ids', 'xs', 'ys', 'scales', 'digest')
+
+	def __init__(self):
+		self.glyph_ids = array('i')
+		self.style_ids = array('i')
+		self.xs = array('d')
+		self.ys = array('d')
+		self.scales = array('d')
+		self.digest = None
+
+	def __len__(self):
+		return len(self.glyph_ids)
+
+	def append(self, glyph_id, style_id, x, y, scale):
+		self.glyph_ids.append(glyph_id)
+		self.style_ids.append(style_id)
+		self.xs.append(x)
+		self.ys.append(y)
+		self.scales.append(scale)
+
+	def placements(self):
+		return zip(self.glyph_ids, self.style_ids, self.xs, self.ys, self.scales)
+
+	def get_digest(self, glyph_names, style_names):
+		# A hash of the placements, by glyph and style name rather than id, so equal pages
+		# of different layouts hash the same. computed once, since a laid out page never changes.
+		if self.digest is None:
+			digest = hashlib.sha1()
+			for values in (self.glyph_ids, self.style_ids, self.xs, self.ys, self.scales):
+				digest.update(values.tobytes())
+			for glyph_id in sorted(set(self.glyph_ids)):
+				digest.update(('%d=%s\n' % (glyph_id, glyph_names[glyph_id])).encode('utf-8'))
+			for style_id in sorted(set(self.style_ids)):
+				digest.update(('%d=%s\n' % (style_id, style_names[style_id])).encode('utf-8'))
+			self.digest = digest.digest()
+		return self.digest
+
+
+class OCCProofingMetrics(object):
+	# Glyph resolution and metrics for a proof: the glyph sequence resolved into
+	# unique glyph names, and for each style the shared layers and advance widths
+	# of those glyphs. Layouts built on the same metrics share all of its lookups.
+	#
+	# Layers are fetched one glyph at a time, as their widths or outlines are needed.
+	# With a disk cache (see store.py), widths it already has don't need their layers
+	# at all; style_keys identify each style's interpolation in the cache.
+	#
+	# Which glyphs each style has is settled once, when the style is prepared: a glyph
+	# a style doesn't have takes the layer of the `fallback` glyph instead, or when
+	# that's missing too, a placeholder box (a None layer), so nothing downstream
+	# needs to check for missing glyphs.
+	def __init__(self, glyphs, exports, profile=None, stamps=None, disk_cache=None, style_keys=None, fallback=None):
+		self.exports = exports
+		self.fallback = fallback if fallback != '' else None
+		self.stamps = stamps if stamps is not None else {}
+		self.profile = profile if profile is not None else OCCProofingProfile()
+		self.disk_cache = disk_cache
+		self.style_keys = style_keys if style_keys is not None else {}
+
+		# Resolve the glyph sequence into indices of unique glyph names,
+		# so that metrics are fetched once per glyph per style, no matter
+		# how often that glyph repeats in the proof.
+		self.glyph_names = []
+		self.glyph_sequence = []
+		glyph_ids = {}
+		for glyph in glyphs:
+			glyph_name = glyph.name
+			if glyph_name == 'newGlyph':
+				self.glyph_sequence.append(LINE_BREAK)
+				continue
+			if glyph_name not in glyph_ids:
+				glyph_ids[glyph_name] = len(self.glyph_names)
+				self.glyph_names.append(glyph_name)
+			self.glyph_sequence.append(glyph_ids[glyph_name])
+
+		# per style, aligned with glyph_names: whether the style has the glyph, the name
+		# of the glyph whose layer stands in for it (None for a placeholder), layers and
+		# widths, or UNFETCHED, and the stamps of the glyphs they were fetched for.
+		self.available = {}
+		self.sources = {}
+		self.layers = {}
+		self.widths = {}
+		self.layer_stamps = {}
+		self.advance_widths = {}
+
+		# bumped whenever a refresh changed an advance width, since that's
+		# all line breaking depends on.
+		self.widths_version = 0
+
+	def prepare_style(self, style_name):
+		if style_name not in self.widths:
+			glyph_count = len(self.glyph_names)
+			with self.profile.stage('availability'):
+				font_glyphs = self.exports[style_name].glyphs
+				self.available[style_name] = bytearray(glyph_name in font_glyphs for glyph_name in self.glyph_names)
+				self.sources[style_name] = [self.get_source(style_name, glyph_id) for glyph_id in range(glyph_count)]
+			self.layers[style_name] = [UNFETCHED] * glyph_count
+			self.widths[style_name] = [UNFETCHED] * glyph_count
+			self.layer_stamps[style_name] = [self.get_layer_stamp(style_name, glyph_id, self.stamps) for glyph_id in range(glyph_count)]
+
+	def prepare_styles(self, style_names):
+		# the availability of every glyph in every style, ahead of the layout.
+		for style_name in style_names:
+			self.prepare_style(style_name)
+
+	def get_source(self, style_name, glyph_id):
+		if self.available[style_name][glyph_id]:
+			return self.glyph_names[glyph_id]
+		if self.fallback is not None and self.fallback in self.exports[style_name].glyphs:
+			return self.fallback
+		return None
+
+	def get_layer_stamp(self, style_name, glyph_id, stamps):
+		# a glyph drawn as a stand in also changes with the glyph standing in for it.
+		glyph_name = self.glyph_names[glyph_id]
+		source = self.sources[style_name][glyph_id]
+		if source == glyph_name:
+			return stamps.get(glyph_name)
+		return (stamps.get(glyph_name), source, stamps.get(source))
+
+	def get_missing(self):
+		# the glyphs missing from any prepared style, with the styles they're missing from.
+		missing = {}
+		for style_name, available in self.available.items():
+			for glyph_id in range(len(self.glyph_names)):
+				if not available[glyph_id]:
+					missing.setdefault(self.glyph_names[glyph_id], []).append(style_name)
+		return missing
+
+	def get_glyph_layer(self, style_name, glyph_id):
+		# interpolating proxies interpolate each glyph as it is first looked up.
+		self.prepare_style(style_name)
+		layers = self.layers[style_name]
+		if layers[glyph_id] is UNFETCHED:
+			source = self.sources[style_name][glyph_id]
+			layers[glyph_id] = self.get_layer(source, style_name) if source is not None else None
+		return layers[glyph_id]
+
+	def get_width(self, style_name, glyph_id):
+		# the width of one glyph, from the disk cache if it has it, and otherwise from its layer.
+		# safe to call from several threads at once, for different glyphs.
+		self.prepare_style(style_name)
+		widths = self.widths[style_name]
+		if widths[glyph_id] is UNFETCHED:
+			glyph_name = self.glyph_names[glyph_id]
+			stamp = self.layer_stamps[style_name][glyph_id]
+			width = None
+			if self.disk_cache is not None:
+				width = self.disk_cache.get_width(self.style_keys.get(style_name), glyph_name, stamp)
+			if width is None:
+				layer = self.get_glyph_layer(style_name, glyph_id)
+				if layer is not None:
+					width = layer.width
+				else:
+					width = self.exports[style_name].upm * PLACEHOLDER_WIDTH
+				if self.disk_cache is not None:
+					self.disk_cache.set_width(self.style_keys.get(style_name), glyph_name, stamp, width)
+			widths[glyph_id] = width
+		return widths[glyph_id]
+
+	def get_widths(self, style_name):
+		# one width per unique glyph in this style.
+		self.prepare_style(style_name)
+		unfetched = self.layers[style_name].count(UNFETCHED)
+		with self.profile.stage('interpolation'):
+			widths = [self.get_width(style_name, glyph_id) for glyph_id in range(len(self.glyph_names))]
+		self.profile.count('layers fetched', unfetched - self.layers[style_name].count(UNFETCHED))
+		return widths
+
+	def get_layers(self, style_name):
+		# one layer per unique glyph in this style.
+		with self.profile.stage('interpolation'):
+			return [self.get_glyph_layer(style_name, glyph_id) for glyph_id in range(len(self.glyph_names))]
+
+	def refresh(self, exports, stamps):
+		# Bring the metrics up to date with glyph edits. Glyphs whose stamps changed since
+		# they were fetched are forgotten, and the widths that were already known are looked
+		# up again, in the new exports. Returns the number of widths looked up again.
+		self.exports = exports
+		self.stamps = stamps
+		refetched = 0
+		widths_changed = False
+		for style_name, widths in self.widths.items():
+			layers = self.layers[style_name]
+			layer_stamps = self.layer_stamps[style_name]
+			available = self.available[style_name]
+			font_glyphs = exports[style_name].glyphs
+			with self.profile.stage('interpolation'):
+				for glyph_id, glyph_name in enumerate(self.glyph_names):
+					stamp = self.get_layer_stamp(style_name, glyph_id, stamps)
+					if layer_stamps[glyph_id] != stamp:
+						# an edit may have added the glyph to, or removed it from, the style.
+						available[glyph_id] = glyph_name in font_glyphs
+						self.sources[style_name][glyph_id] = self.get_source(style_name, glyph_id)
+						stamp = self.get_layer_stamp(style_name, glyph_id, stamps)
+						previous = widths[glyph_id]
+						layers[glyph_id] = UNFETCHED
+						widths[glyph_id] = UNFETCHED
+						layer_stamps[glyph_id] = stamp
+						if previous is not UNFETCHED:
+							refetched += 1
+							if self.get_width(style_name, glyph_id) != previous:
+								self.advance_widths.pop(style_name, None)
+								widths_changed = True
+		if widths_changed:
+			self.widths_version += 1
+		self.profile.count('layers fetched', refetched)
+		return refetched
+
+	def get_advance_widths(self, style_name):
+		# advance widths in font units, aligned with the glyph sequence.
+		# linebreaks take up no horizontal space.
+		if style_name not in self.advance_widths:
+			unique_widths = self.get_widths(style_name)
+			with self.profile.stage('metrics'):
+				self.advance_widths[style_name] = [unique_widths[glyph_id] if glyph_id != LINE_BREAK else 0 for glyph_id in self.glyph_sequence]
+		return self.advance_widths[style_name]
+
+	def get_layer(self, glyph, style_name):
+		# only called for glyphs the style is known to have.
+		interpolatedFont = self.exports[style_name]
+		interpolatedGlyph = interpolatedFont.glyphs[glyph]
+		return interpolatedGlyph.layers[interpolatedFont.masters[0].id]
 
 
 class OCCProofingLayout(object):
-	def __init__(self, glyphs, parameters, width, height, upm):
+	def __init__(self, glyphs, parameters, width, height, upm, metrics=None, lines=None, profile=None):
 		self.width = width
 		self.height = height		
 		self.glyphs = glyphs[0]
@@ -21,16 +256,42 @@ class OCCProofingLayout(object):
 		self.line_padding = parameters['gaps']['line']
 		self.block_padding = parameters['gaps']['block']
 		self.block_glyph_index = 0
+
+		# pages are laid out lazily: the paginator yields each page once it is
+		# complete, and pages already laid out are kept in self.pages.
 		self.pages = []
+		self.paginator = None
+		# lines placed on the pages laid out so far, out of line_count, for estimating the page count.
+		self.line_count = 0
+		self.lines_placed = 0
+
+		# Metrics and line breaks can be handed over from an earlier layout of the
+		# same glyphs, in which case this layout only has to paginate.
+		self.profile = profile if profile is not None else OCCProofingProfile()
+		self.metrics = metrics if metrics is not None else OCCProofingMetrics(self.glyphs, parameters['exports'], self.profile)
+		self.glyph_names = self.metrics.glyph_names
+		self.glyph_sequence = self.metrics.glyph_sequence
+		self.lines = lines
+
+		self.style_names = []
+		self.style_ids = {}
+		for style_name in parameters['instances']:
+			self.get_style_id(style_name)
+
+	def get_style_id(self, style_name):
+		if style_name not in self.style_ids:
+			self.style_ids[style_name] = len(self.style_names)
+			self.style_names.append(style_name)
+		return self.style_ids[style_name]
+
+	def get_layers(self, style_name):
+		return self.metrics.get_layers(style_name)
+
+	def get_advance_widths(self, style_name):
+		return self.metrics.get_advance_widths(style_name)
 
 	def get_layer(self, glyph, style_name):
-		interpolatedFont = self.parameters['exports'][style_name]
-		if glyph in interpolatedFont.glyphs:
-			interpolatedGlyph = interpolatedFont.glyphs[glyph]
-			layer = interpolatedGlyph.layers[interpolatedFont.masters[0].id]
-			return layer
-		else:
-			print(glyph, "does not exist in the instance")
+		return self.metrics.get_layer(glyph, style_name)
 
 	def get_scalefactor(self, pts_per_em):
 		return self.em_per_u * \
@@ -38,16 +299,55 @@ class OCCProofingLayout(object):
 			self.px_per_in * \
 			pts_per_em
 
+	def get_page_hash(self, page, versions):
+		# A hash of everything a page's content depends on: its placements, the versions of
+		# the outlines it places, indexed by [style_id][glyph_id], and the page size.
+		digest = hashlib.sha1(page.get_digest(self.glyph_names, self.style_names))
+		digest.update(('%r,%r\n' % (self.width, self.height)).encode('utf-8'))
+		for style_id, glyph_id in sorted(set(zip(page.style_ids, page.glyph_ids))):
+			digest.update(('%s\n' % (versions[style_id][glyph_id],)).encode('utf-8'))
+		return digest.hexdigest()
+
+	def get_shape(self, style_id, glyph_id):
+		# the layer shared by every placement of this glyph in this style. read only.
+		return self.metrics.get_glyph_layer(self.style_names[style_id], glyph_id)
+
+	def iter_pages(self):
+		# Yields the pages already laid out, then lays out and yields the rest.
+		page_index = 0
+		while True:
+			if page_index < len(self.pages):
+				yield self.pages[page_index]
+				page_index += 1
+			elif self.paginator is not None:
+				try:
+					with self.profile.stage('layout'):
+						page = next(self.paginator)
+					self.pages.append(page)
+				except StopIteration:
+					self.paginator = None
+			else:
+				return
+
 	def get(self):
+		for page in self.iter_pages():
+			pass
 		return self.pages
 
+	def get_page_count(self):
+		# The page count, and whether it's exact: once every page is laid out it is, and
+		# until then it's extrapolated from the share of lines the pages so far hold, since
+		# the line breaks are known ahead of pagination.
+		if self.paginator is None:
+			return len(self.pages), True
+		if self.lines_placed == 0:
+			return max(1, len(self.pages)), False
+		return max(len(self.pages), int(math.ceil(len(self.pages) * self.line_count / float(self.lines_placed)))), False
 
-class OCCProofingParagraphLayout(OCCProofingLayout):
-	def __init__(self, glyphs, parameters, width, height, upm):
-		super(OCCProofingParagraphLayout, self).__init__(glyphs, parameters, width, height, upm)
 
-		page_index = 0
-		pages = [[]]
+class OCCProofingParagraphLayout(OCCProofingLayout):
+	def __init__(self, glyphs, parameters, width, height, upm, metrics=None, lines=None, profile=None):
+		super(OCCProofingParagraphLayout, self).__init__(glyphs, parameters, width, height, upm, metrics, lines, profile)
 
 		# 1. determine which parameter group takes defines the shortest line.
 		#    and define the block size.
@@ -58,11 +358,22 @@ class OCCProofingParagraphLayout(OCCProofingLayout):
 			self.pages = []
 			return
 
-		page_origin_x_px = parameters['gaps']['left']
 		available_space_x_px = self.width - self.parameters['gaps']['right']
-		page_origin_y_px = self.height - parameters['gaps']['top']
 
-		block_advance_position_x_px = 0
+		# 2. break each paragraph into line boxes once. Placing them on pages
+		#    only shifts their coordinates.
+		if self.lines is None:
+			self.lines = [self.get_line_boxes(style_name, self.get_scalefactor(point_size), available_space_x_px) for i, (style_name, point_size) in parameter_rows]
+
+		self.line_count = sum(len(line_starts) for glyph_ids, offsets_x_px, line_starts, ends_with_break in self.lines)
+		self.paginator = self.paginate(parameter_rows)
+
+	def paginate(self, parameter_rows):
+		page = OCCProofingPage()
+
+		page_origin_x_px = self.parameters['gaps']['left']
+		page_origin_y_px = self.height - self.parameters['gaps']['top']
+
 		block_advance_position_y_px = 0
 
 		for i, (style_name, point_size) in parameter_rows:
@@ -70,91 +381,110 @@ class OCCProofingParagraphLayout(OCCProofingLayout):
 			# each of these represents a paragraph.
 			u_to_px = self.get_scalefactor(point_size)
 			height_px = (master.ascender - master.descender) * u_to_px + self.line_padding
+			style_id = self.get_style_id(style_name)
 
-			block_advance_position_x_px = 0
-			block_advance_position_y_px += height_px
+			glyph_ids, offsets_x_px, line_starts, ends_with_break = self.lines[i]
+			line_count = len(line_starts)
 
-			page_start_index = len(pages[page_index])
-			# backtracked = False
-			i = 0
+			block_advance_position_y_px += height_px
 
-			while i < len(self.glyphs):
+			# if the paragraph shares this page with earlier paragraphs, but won't fit in
+			# what's left of it, move the whole paragraph onto a new page.
+			last_line_y_px = block_advance_position_y_px + (line_count - 1) * height_px
+			if line_count > 0 and len(page) > 0 and page_origin_y_px - last_line_y_px < self.parameters['gaps']['bottom']:
+				yield page
+				page = OCCProofingPage()
+				block_advance_position_y_px = height_px
+
+			# 3. place the line boxes, starting new pages as they run off the bottom.
+			for line_index in range(line_count):
+				if line_index > 0:
+					block_advance_position_y_px += height_px
 
 				if page_origin_y_px - block_advance_position_y_px < self.parameters['gaps']['bottom']:
 					# we've fallen off the end of the page, time to add another one.
+					yield page
+					page = OCCProofingPage()
 					block_advance_position_y_px = height_px
-					block_advance_position_x_px = 0
 
-					pages.append([])
+				line_start = line_starts[line_index]
+				line_end = line_starts[line_index + 1] if line_index + 1 < line_count else len(glyph_ids)
+				y_px = page_origin_y_px - block_advance_position_y_px
+				for j in range(line_start, line_end):
+					page.append(glyph_ids[j], style_id, page_origin_x_px + offsets_x_px[j], y_px, u_to_px)
+				self.lines_placed += 1
 
-					if page_start_index > 0:  # if we have some unrelated glyphs on the previous page, shift em down
-						page_previous_block = pages[page_index][:page_start_index]
-						pages[page_index] = page_previous_block
-						i = 0
+			if ends_with_break:
+				block_advance_position_y_px += height_px
 
-					page_start_index = 0
-					page_index += 1
+			block_advance_position_y_px += self.block_padding
 
-				this_glyph = self.glyphs[i]
-				glyph_name = this_glyph.name
+		yield page
 
-				if (glyph_name == 'newGlyph'):
-					# print('paragraph break')
-					block_advance_position_y_px += height_px
-					block_advance_position_x_px = 0
-				else:
-					layer = self.get_layer(glyph_name, style_name)
-					orphan_layer = layer.copy()
-					orphan_layer.parent = layer.parent
-					width_px = (orphan_layer.width * u_to_px)
-
-					# if this glyph would knock us over the end of the line,
-					# reset the height and x position, and retry.
-					if block_advance_position_x_px + width_px > available_space_x_px:
-						block_advance_position_y_px += height_px
-						block_advance_position_x_px = 0
-						continue
-
-					draw = {
-						'path': orphan_layer,
-						'scale': u_to_px,
-						'x': page_origin_x_px + block_advance_position_x_px,
-						'y': page_origin_y_px - block_advance_position_y_px
-					}
-
-					pages[page_index].append(draw)
-					block_advance_position_x_px += width_px
-
-				# apply a kerning transform here.
-				# interpolatedFontProxy doesn't have kerning :c :c :c
-				# if i < len(self.glyphs[0]) - 1:
-				# 	next_glyph = self.glyphs[0][i + 1]
-				# 	print(dir(master[1].font))
-				# 	k = master[1].font.kerningForPair(master[1].id, glyph.rightKerningKey, next_glyph.leftKerningKey)
-				# 	print(k)
-				# 	print(k * u_to_px)
-				# 	next_layer = self.get_layer(next_glyph, master[1])
-
-				# next step. Check whether the width is too big for the and wrap the advance height.
-				if block_advance_position_x_px > available_space_x_px:
-					block_advance_position_y_px += height_px
-					block_advance_position_x_px = 0
+	def get_line_boxes(self, style_name, u_to_px, available_space_x_px):
+		# Break the glyph sequence into lines for one paragraph style.
+		# Returns the placed glyph ids and their x offsets as parallel arrays,
+		# the index into those arrays at which each line box starts, and whether
+		# the final glyph ended its line (so the paragraph takes up one more line).
+		widths = self.get_advance_widths(style_name)
+		glyph_ids = array('i')
+		offsets_x_px = array('d')
+		line_starts = array('i')
 
-				i += 1
+		block_advance_position_x_px = 0
+		line_open = False
+		glyph_count = len(self.glyph_sequence)
+		i = 0
 
-			block_advance_position_y_px += self.block_padding
+		while i < glyph_count:
+			if not line_open:
+				line_starts.append(len(glyph_ids))
+				line_open = True
 
-		self.pages = pages
+			glyph_id = self.glyph_sequence[i]
 
+			if (glyph_id == LINE_BREAK):
+				# print('paragraph break')
+				block_advance_position_x_px = 0
+				line_open = False
+			else:
+				width_px = (widths[i] * u_to_px)
 
-class OCCProofingWaterfallLayout(OCCProofingLayout):
-	def __init__(self, glyphs, parameters, width, height, upm):
-		super(OCCProofingWaterfallLayout, self).__init__(glyphs, parameters, width, height, upm)
+				# if this glyph would knock us over the end of the line,
+				# start a new line and retry. A glyph wider than a whole
+				# line is placed on a line of its own.
+				if block_advance_position_x_px + width_px > available_space_x_px and block_advance_position_x_px > 0:
+					block_advance_position_x_px = 0
+					line_open = False
+					continue
+
+				glyph_ids.append(glyph_id)
+				offsets_x_px.append(block_advance_position_x_px)
+				block_advance_position_x_px += width_px
+
+			# apply a kerning transform here.
+			# interpolatedFontProxy doesn't have kerning :c :c :c
+			# if i < len(self.glyphs[0]) - 1:
+			# 	next_glyph = self.glyphs[0][i + 1]
+			# 	print(dir(master[1].font))
+			# 	k = master[1].font.kerningForPair(master[1].id, glyph.rightKerningKey, next_glyph.leftKerningKey)
+			# 	print(k)
+			# 	print(k * u_to_px)
+			# 	next_layer = self.get_layer(next_glyph, master[1])
+
+			# next step. Check whether the width is too big for the and wrap the advance height.
+			if block_advance_position_x_px > available_space_x_px:
+				block_advance_position_x_px = 0
+				line_open = False
 
-		if PROFILE:
-			import cProfile
-			__profile = cProfile.Profile()
-			__profile.enable()
+			i += 1
+
+		return glyph_ids, offsets_x_px, line_starts, glyph_count > 0 and not line_open
+
+
+class OCCProofingWaterfallLayout(OCCProofingLayout):
+	def __init__(self, glyphs, parameters, width, height, upm, metrics=None, lines=None, profile=None):
+		super(OCCProofingWaterfallLayout, self).__init__(glyphs, parameters, width, height, upm, metrics, lines, profile)
 
 		parameter_rows = list(enumerate(zip(parameters['instances'], parameters['point_sizes'])))
 		# If we don't have any rendering criteria, we can't render. Fail early.
@@ -168,9 +498,18 @@ class OCCProofingWaterfallLayout(OCCProofingLayout):
 		self.block_line_origin = (self.block_line_heights[0] - self.line_padding) if len(self.block_line_heights) > 0 else 0
 		self.block_height = sum(self.block_line_heights) + self.block_padding
 
+		# Find every block's line break in a single pass over the advance widths.
+		if self.lines is None:
+			self.lines = self.get_line_lengths(parameter_rows)
+
+		self.line_count = len(self.lines) * len(parameter_rows)
+		self.paginator = self.paginate(parameter_rows)
+
+	def paginate(self, parameter_rows):
+		parameters = self.parameters
+
 		# 2. layout each block.
-		pages = [[]]
-		page_index = 0
+		page = OCCProofingPage()
 
 		page_origin_x_px = parameters['gaps']['left']
 		page_origin_y_px = self.height - parameters['gaps']['top']
@@ -189,63 +528,48 @@ class OCCProofingWaterfallLayout(OCCProofingLayout):
 		# as a glyph when once glyph is present in one font, and not in the
 		# other one.
 
-		# Helper Methods for Profiling
-		def select_second_element(a):
-			return a[1]
-
-		while len(self.glyphs[self.block_glyph_index:]) > 0:
+		for block_line_length in self.lines:
 
 			# If we have a block-size that fits onto a single page, check for when a block runs off the page,
 			# and advance it to the next page.
 			if block_origin_y_px - self.block_height < parameters['gaps']['bottom'] and self.block_glyph_index > 0:
 				# This block overshoots the end of the page.
 				# time to create a new page, and reset the block data.
-				pages.append([])
-				page_index += 1
+				yield page
+				page = OCCProofingPage()
 				block_origin_y_px = page_origin_y_px
 				block_advance_position_y_px = self.block_line_origin
 
-			# we need to know what the line offset is, so that we can shift to
-			# the next page, if we need to.
-
-			# First, get the line-length for this line
-			bounds_per_line = list(map(self.get_line_lengths, parameter_rows))
-			block_line_length = min(list(map(select_second_element, bounds_per_line)))
-
 			# Then layout the line with this length
-			block_glyphs = list(self.glyphs[self.block_glyph_index: self.block_glyph_index + block_line_length])
-
 			for i, (style_name, point_size) in parameter_rows:
 				# print('master = %d' % (i + 1))
-				# print('page = %d' % (page_index + 1))
+				# print('page = %d' % (len(self.pages) + 1))
 				# print('origin = %d\n' % (block_origin_y_px - block_advance_position_y_px))
 
 				# Layout the current line.
 				u_to_px = self.get_scalefactor(point_size)
-
-				for glyph in block_glyphs:
-					glyph_name = glyph.name
-					if glyph_name != 'newGlyph':
-						layer = self.get_layer(glyph.name, style_name)
-						orphan_layer = layer.copy()
-						orphan_layer.parent = layer.parent
-						# print(orphan_layer)
-						draw = {
-							'path': orphan_layer,
-							'scale': u_to_px,
-							'x': block_origin_x_px + block_advance_position_x_px,
-							'y': block_origin_y_px - block_advance_position_y_px
-						}
-						pages[page_index].append(draw)
-						block_advance_position_x_px += (orphan_layer.width * u_to_px)
+				style_id = self.get_style_id(style_name)
+				widths = self.get_advance_widths(style_name)
+
+				for glyph_index in range(self.block_glyph_index, self.block_glyph_index + block_line_length):
+					glyph_id = self.glyph_sequence[glyph_index]
+					if glyph_id != LINE_BREAK:
+						page.append(
+							glyph_id,
+							style_id,
+							block_origin_x_px + block_advance_position_x_px,
+							block_origin_y_px - block_advance_position_y_px,
+							u_to_px)
+						block_advance_position_x_px += (widths[glyph_index] * u_to_px)
 
 				block_advance_position_y_px += self.block_line_heights[i + 1] if len(self.block_line_heights) > i + 1 else 0
 				block_advance_position_x_px = 0
+				self.lines_placed += 1
 
 				# I need something here to advance the page pointer.
 				if block_origin_y_px - block_advance_position_y_px <= parameters['gaps']['bottom']:
-					pages.append([])
-					page_index += 1
+					yield page
+					page = OCCProofingPage()
 					block_origin_y_px = page_origin_y_px
 					block_advance_position_y_px = self.block_line_origin
 
@@ -255,12 +579,7 @@ class OCCProofingWaterfallLayout(OCCProofingLayout):
 			block_origin_y_px -= self.block_height
 			block_index += 1
 
-		self.pages = pages
-
-		if PROFILE:
-			__profile.disable()
-			__stats = Stats(__profile)
-			__stats.sort_stats('cumulative').print_stats()
+		yield page
 
 	def get_line_heights(self, data):
 		line_index, (style_name, point_size) = data
@@ -271,31 +590,47 @@ class OCCProofingWaterfallLayout(OCCProofingLayout):
 
 		return line_index, height_px
 
-	def get_line_lengths(self, data):
-		# line_index, ((font_index, style_name), point_size) = data
-		line_index, (style_name, point_size) = data
-
-		u_to_px = self.get_scalefactor(point_size)
-		advance_px = self.parameters['gaps']['left']
-		glyph_count = 0
+	def get_line_lengths(self, parameter_rows):
+		# Walk the glyph sequence once, advancing the pen of every row in step.
+		# A block's line ends at a linebreak, or at the first glyph that reaches the
+		# right margin in any row; glyphs that overshoot it move to the next block.
 		available_space_px = self.width - self.parameters['gaps']['right']
+		rows = [(self.get_advance_widths(style_name), self.get_scalefactor(point_size)) for i, (style_name, point_size) in parameter_rows]
 
-		while advance_px < available_space_px and self.block_glyph_index + glyph_count < len(self.glyphs):
-			this_glyph = self.glyphs[self.block_glyph_index + glyph_count]
-			glyph_name = this_glyph.name
+		line_lengths = []
+		line_start = 0
+		advances_px = [self.parameters['gaps']['left']] * len(rows)
 
-			if glyph_name == 'newGlyph':
-				width_px = 0
-				advance_px = available_space_px
+		i = 0
+		glyph_count = len(self.glyph_sequence)
+		while i < glyph_count:
+			if self.glyph_sequence[i] == LINE_BREAK:
+				line_end = i + 1
 			else:
-				layer = self.get_layer(glyph_name, style_name)
-				width_px = layer.width * u_to_px
-			advance_px += width_px
-			glyph_count += 1
+				overshoots = False
+				fills = False
+				for row, (widths, u_to_px) in enumerate(rows):
+					advances_px[row] += widths[i] * u_to_px
+					overshoots = overshoots or advances_px[row] > available_space_px
+					fills = fills or advances_px[row] >= available_space_px
+
+				if overshoots and i > line_start:
+					line_end = i
+				elif overshoots or fills:
+					# a glyph wider than the whole line still gets a line to itself.
+					line_end = i + 1
+				else:
+					i += 1
+					continue
+
+			line_lengths.append(line_end - line_start)
+			line_start = i = line_end
+			advances_px = [self.parameters['gaps']['left']] * len(rows)
 
-		line_length = glyph_count - 1 if advance_px > available_space_px else glyph_count
+		if line_start < glyph_count:
+			line_lengths.append(glyph_count - line_start)
 
-		return line_index, line_length
+		return line_lengths
 
 
 PROOFING_LAYOUTS = {
@@ -2,7 +2,6 @@
 
 
 import re
-import os
 import json
 from collections import OrderedDict
 
@@ -11,6 +10,9 @@ from vanilla import Group, SegmentedButton, List, Button, PopUpButtonListCell, B
 from vanilla.dialogs import putFile
 
 from templates import OCCTemplatesView
+from index import OCCGlyphIndex
+from interpolation import OCCInterpolationCache, get_masters_fingerprint
+from changes import OCCChangeTracker
 from preferences import OCCTemplatePreferences
 
 ELEMENT_PADDING = 8
@@ -50,7 +52,10 @@ class OCCParametersView:
 		parent_window,
 		parametersChangedCallback=None,
 		saveProofCallback=None,
-		printProofCallback=None
+		printProofCallback=None,
+		watchModeCallback=None,
+		templateLoadedCallback=None,
+		preferences=None
 	):
 
 		self.window_width = width_px
@@ -58,19 +63,23 @@ class OCCParametersView:
 		self.parametersChangedCallback = parametersChangedCallback
 		self.saveProofCallback = saveProofCallback
 		self.printProofCallback = printProofCallback
+		self.watchModeCallback = watchModeCallback
+		self.templateLoadedCallback = templateLoadedCallback
 
-		self.preferences = OCCTemplatePreferences()
-		self.templates = OCCTemplatesView(self.preferences)
+		self.preferences = preferences if preferences is not None else OCCTemplatePreferences()
+		self.glyphIndex = OCCGlyphIndex(Glyphs.font)
+		self.templates = OCCTemplatesView(self.preferences, self.glyphIndex)
 		self.templateFiles = []
 		self.templateFiles.extend(self.templates.templateFiles)
 
 		self.instances = self.templates.instanceList
 
-		self.interpolated_instances = {}
+		self.interpolated_instances = OCCInterpolationCache(self.preferences.interpolationCacheSize)
+		self.changes = OCCChangeTracker()
 
 		self.outputPath = None
 
-		self.glyphs = list(filter(lambda g: g.category == 'Letter' and g.subCategory == 'Uppercase' and g.script == 'latin', Glyphs.font.glyphs))
+		self.glyphs = self.glyphIndex.get_glyphs(category='Letter', sub_category='Uppercase', script='latin')
 		self.templateGlyphs = []
 
 		self.proof_mode = 'waterfall'
@@ -91,7 +100,6 @@ class OCCParametersView:
 			'title': '',
 			'footer': '',
 			'mode': 'waterfall',
-			'reinterpolate': False,
 			'glyphs': [[]]
 		}
 
@@ -179,7 +187,6 @@ class OCCParametersView:
 					"title": "Point Size"
 				}
 			],
-			editCallback=self.triggerInstanceListEdit,
 			drawFocusRing=False,
 			allowsSorting=False,
 			allowsEmptySelection=True,
@@ -273,12 +280,13 @@ class OCCParametersView:
 		self.group.output = Group((ELEMENT_PADDING, -160, windowSize[2], 150))
 		LINE_POS = 0
 
-		self.group.output.refreshInstances = CheckBox(
+		self.group.output.watchMode = CheckBox(
 			(ELEMENT_PADDING, LINE_POS, 150, HEIGHT_LABEL),
-			"Refresh glyphs",
+			"Watch for edits",
+			callback=self.triggerWatchModeChange,
 			value=False
 		)
-		self.group.output.refreshInstances.setToolTip("Uncheck this to only adjust the proof layout with existing styles. Keep checked for any changes in the list of styles.")
+		self.group.output.watchMode.setToolTip("Check to update the proof automatically as you edit the proofed glyphs. Pages without edited glyphs are reused as they are; only the pages and glyph sheets holding edited glyphs are drawn again.")
 
 		self.group.output.debugMode = CheckBox(
 			(-ELEMENT_PADDING - 80, LINE_POS, 80, HEIGHT_LABEL),
@@ -336,9 +344,6 @@ class OCCParametersView:
 	def triggerParametersEdit(self, sender):
 		self.parameters = self.getParameterSet()
 
-	def triggerInstanceListEdit(self, sender):
-		self.group.output.refreshInstances.set(1)
-
 	def triggerTemplateListEdit(self, sender):
 		self.preferences.saveTemplates(self.templateFiles)
 
@@ -356,7 +361,11 @@ class OCCParametersView:
 		self.tryRerender()
 
 	def loadSelectedTemplate(self, selectedIndex):
-		template = self.templates.data[selectedIndex]
+		# templates are only validated in full once they're selected.
+		template = self.templates.getTemplate(selectedIndex)
+		if template is None:
+			print(f"[{self.templates.data[selectedIndex]['name']}] couldn’t load this template.")
+			return
 		self.glyphs = list()
 		for n in template["glyphs"]:
 			if n == "newGlyph":  # linebreak
@@ -364,7 +373,7 @@ class OCCParametersView:
 				newGlyph.name = 'newGlyph'
 				self.glyphs.append(newGlyph)
 			else:
-				self.glyphs.append(Glyphs.font.glyphs[n])
+				self.glyphs.append(self.glyphIndex.get_glyph(n))
 
 		self.templateGlyphs = self.glyphs.copy()  # store for refrence
 		lines = list(map(lambda row: {"Style": row['style'], "Point Size": row['size']}, template['lines']))
@@ -389,8 +398,12 @@ class OCCParametersView:
 		self.group.edit.list._editCallback = None
 		self.group.edit.list.set(lines)
 
-	def formatTemplateForDisplayList(self, template):
-		return {'Templates': template['name']}
+		if self.templateLoadedCallback is not None:
+			# the template's proof will use the template glyphs, and the styles just loaded.
+			self.templateLoadedCallback(self.getParameterSet(), [self.glyphs])
+
+	def formatTemplateForDisplayList(self, entry):
+		return {'Templates': entry['name']}
 
 	def triggerSaveProofAsTemplate(self, sender):
 		name = self.group.output.proofname.get()
@@ -444,23 +457,21 @@ class OCCParametersView:
 		modified_indices = []
 		if template_files is not None and len(template_files) > 0:
 			for filepath in template_files:
-				with open(filepath, 'r') as template_file:
-					name = filepath.split(os.path.sep)[-1]
-					template = self.templates.parseTemplateFile(name, template_file)
-					if template is not None:
-						display = self.formatTemplateForDisplayList(template)
-						self.templateFiles.append(filepath)
-						self.preferences.saveTemplates(self.templateFiles)
-
-						try:
-							i = self.group.templates.list.index(display)
-							self.templates.data[i] = template
-							self.group.templates.list[i] = display
-							modified_indices.append(i)
-						except ValueError:
-							self.templates.data.append(template)
-							self.group.templates.list.append(display)
-							modified_indices.append(len(self.group.templates.list) - 1)
+				entry = self.templates.loadTemplateEntry(filepath)
+				if entry is not None:
+					display = self.formatTemplateForDisplayList(entry)
+					self.templateFiles.append(filepath)
+					self.preferences.saveTemplates(self.templateFiles)
+
+					try:
+						i = self.group.templates.list.index(display)
+						self.templates.data[i] = entry
+						self.group.templates.list[i] = display
+						modified_indices.append(i)
+					except ValueError:
+						self.templates.data.append(entry)
+						self.group.templates.list.append(display)
+						modified_indices.append(len(self.group.templates.list) - 1)
 			if len(modified_indices) > 0:
 				self.loadSelectedTemplate(modified_indices[-1])
 				self.group.templates.list.setSelection([modified_indices[-1]])
@@ -469,7 +480,6 @@ class OCCParametersView:
 		self.setActiveSection(int(sender.get()))
 
 	def triggerAddRowToParametersList(self, sender):
-		self.group.output.refreshInstances.set(1)
 		if len(self.group.edit.list) > 0:
 			last_style = self.group.edit.list[-1]['Style']
 			last_ptsz = self.group.edit.list[-1]['Point Size']
@@ -480,42 +490,33 @@ class OCCParametersView:
 				"Point Size": 24})
 
 	def triggerRemoveSelectedFromParametersList(self, sender):
-		self.group.output.refreshInstances.set(1)
 		for index in reversed(self.group.edit.list.getSelection()):
 			del self.group.edit.list[index]
 
+	def triggerWatchModeChange(self, sender):
+		if self.watchModeCallback is not None:
+			self.watchModeCallback(bool(sender.get()))
+
 	def triggerDebugModeChange(self, sender):
 		self.templates.debug = bool(sender.get())
 		self.preferences.saveDebug(sender.get())
 
-	def parametersChanged(self, parameters, glyphs):
-		glyphsChanged = parameters['glyphs'][0] != self.parameters['glyphs'][0]
-		layoutChanged = parameters['gaps'] != self.parameters['gaps']
-		instancesChanged = parameters['instances'] != self.parameters['instances']
-		sizesChanged = parameters['point_sizes'] != self.parameters['point_sizes']
-		titleChanged = parameters['title'] != self.parameters['title']
-		footerChanged = parameters['footer'] != self.parameters['footer']
-		modeChanged = parameters['mode'] != self.parameters['mode']
-
-		paramsChanged = layoutChanged or instancesChanged or sizesChanged or modeChanged
-		metadataChanged = titleChanged or footerChanged
-
-		return glyphsChanged or paramsChanged or metadataChanged
-
 	def tryRerender(self):
 		if self.parametersChangedCallback is not None:
 
-			newParamSet = self.getParameterSet()
+			# the glyph set comes first: the interpolated styles are checked
+			# against the glyphs in this proof.
 			newGlyphSet = self.getGlyphSet()
+			self.interpolated_instances.reset_counters()
+			newParamSet = self.getParameterSet()
 
-			# check to see if the parameters actually changed.
-			if self.parametersChanged(newParamSet, newGlyphSet):
-				# cache latest parameter state.
-				self.parameters = newParamSet
-				self.parameters['glyphs'] = newGlyphSet
-				print(f"Generating Proof [{self.parameters['title']}]...")
+			# cache latest parameter state. the proofing pipeline works out
+			# which of its stages actually need to run again for the changes.
+			self.parameters = newParamSet
+			self.parameters['glyphs'] = newGlyphSet
+			print(f"Generating Proof [{self.parameters['title']}]...")
 
-				self.parametersChangedCallback(newParamSet, newGlyphSet)
+			self.parametersChangedCallback(newParamSet, newGlyphSet)
 
 	def setActiveSection(self, index):
 		if index != 0 and index != 1 and index != 2:
@@ -527,7 +528,9 @@ class OCCParametersView:
 	def getGlyphSet(self):
 		index = int(self.group.edit.glyphSelection.get())
 		if index == 1:
-			self.glyphs = list(filter(lambda g: g.selected, Glyphs.font.glyphs))
+			# the font's own selection, rather than checking every glyph in the font.
+			self.glyphIndex.refresh()
+			self.glyphs = self.glyphIndex.sort_glyphs(Glyphs.font.selection)
 		elif index == 2:
 			if Glyphs.font.currentTab is not None:
 				self.glyphs = list(map(lambda l: l.parent, Glyphs.font.currentTab.layers))
@@ -535,11 +538,33 @@ class OCCParametersView:
 			self.glyphs = self.templateGlyphs
 		return [self.glyphs]
 
+	def getExports(self, instances, glyph_names):
+		# The interpolated styles for a proof, along with the change stamps of its glyphs.
+		# interpolated styles come out of the shared instance cache, which interpolates
+		# again only the styles, or the glyphs in them, that changed since they were last proofed.
+		# the fallback glyph is stamped too, since it stands in for any glyph a style is missing.
+		if self.preferences.fallbackGlyph != '':
+			glyph_names = list(glyph_names) + [self.preferences.fallbackGlyph]
+		stamps = self.changes.get_stamps(Glyphs.font, glyph_names)
+		fingerprint = get_masters_fingerprint(Glyphs.font)
+		exports = {}
+		export_keys = {}
+		for style_name in instances:
+			if style_name not in exports:
+				instance = self.instances[style_name]
+				exports[style_name] = self.interpolated_instances.get(style_name, instance, fingerprint, stamps)
+				export_keys[style_name] = self.interpolated_instances.get_key(instance, fingerprint)
+		return stamps, exports, export_keys
+
+	def updateExports(self, parameters, glyphs):
+		# a copy of an earlier proof's parameters, brought up to date with any glyph edits since.
+		parameters = dict(parameters)
+		parameters['stamps'], parameters['exports'], parameters['export_keys'] = self.getExports(parameters['instances'], [glyph.name for glyph in glyphs[0]])
+		return parameters
+
 	def getParameterSet(self):
-		if (self.group.output.refreshInstances.get() == 1):
-			instances = []
-		else:
-			instances = self.parameters['instances']
+		# the style list is always rebuilt from the edit list.
+		instances = []
 		point_sizes = []
 
 		# pre_interpolation = default_timer()
@@ -553,15 +578,6 @@ class OCCParametersView:
 				if item['Style'] in self.instances.keys():
 					style_name = item['Style']
 					instances.append(style_name)
-					if style_name not in self.interpolated_instances:
-						# we haven't interpolated this instance yet.
-						# interpolate the instance and store it in our shared instance cache for future use.
-						instance = self.instances[style_name]
-						# NOTE(nic): trying out `interpolatedFontProxy` here instead of `interpolatedFont`.
-						# accoding to [the docs](https://docu.glyphsapp.com/#GSInstance.interpolatedFontProxy),
-						# iterpolatedFontProxy interpolates glyphs on demand, rather than interpolating the entire instance.
-						# This means we do work proportional to the glyphs in the proof, rather than in the font.
-						self.interpolated_instances[style_name] = instance.interpolatedFontProxy
 				point_sizes.append(size)
 
 			else:
@@ -569,6 +585,8 @@ class OCCParametersView:
 
 		# print('[profile] time to interpolate: %.03f seconds' % (default_timer() - pre_interpolation))
 
+		stamps, exports, export_keys = self.getExports(instances, [glyph.name for glyph in self.glyphs])
+
 		parameters = {
 			'gaps': {
 				'left': tryParseInt(self.group.edit.layout.left.get(), self.parameters['gaps']['left']),
@@ -580,14 +598,16 @@ class OCCParametersView:
 			},
 			'glyphs': self.glyphs,
 			'instances': instances,
-			'exports': self.interpolated_instances,
+			'exports': exports,
+			'export_keys': export_keys,
+			'stamps': stamps,
+			'fallback': self.preferences.fallbackGlyph,
 			'point_sizes': list(map(int, point_sizes)),
 			'aligned': True,
 			'document': {'width': 11, 'height': 8.5},
 			'title': tryString(self.group.output.proofname.get(), self.parameters['title']),
 			'footer': tryString(self.group.edit.layout.prooffooter.get(), self.parameters['footer']),
-			'mode': self.proof_mode,
-			'reinterpolate': self.group.output.refreshInstances.get()
+			'mode': self.proof_mode
 		}
 		# print('PARAMS', parameters)
 		return parameters
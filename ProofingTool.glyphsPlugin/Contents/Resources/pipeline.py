@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from layout import PROOFING_LAYOUTS, OCCProofingMetrics
+from profiling import OCCProofingProfile
+
+# The memoized stages of a proof, in order: metrics, lines and pages. Every stage is
+# keyed on a fingerprint of its inputs, and a stage's fingerprint includes the
+# fingerprint of the stage before it, so a change only re-runs the stages downstream of it.
+#
+# Rendering isn't memoized here, but by the renderer, a page at a time: pages are kept
+# by a hash of their content (see OCCProofingLayout.get_page_hash), and the metadata
+# overlay (title, footer, date) is stamped over them on every proof, so editing the
+# title or footer only stamps the pages' text again.
+#
+# Glyph edits are tracked per glyph, through the change stamps in parameters['stamps']:
+# metrics are kept across edits and refresh only the glyphs that changed, line breaking
+# and pagination only run again when an edit changed an advance width, and the renderer
+# reuses every page that doesn't place an edited glyph, or a glyph on the same glyph sheet.
+
+
+class OCCProofingPipeline(object):
+	def __init__(self, profile=None, disk_cache=None):
+		self.profile = profile if profile is not None else OCCProofingProfile()
+		self.disk_cache = disk_cache
+		self.memos = {}
+		self.fingerprints = {}
+		self.recomputed = []
+
+	def lookup(self, stage, fingerprint):
+		self.fingerprints[stage] = fingerprint
+		memo = self.memos.get(stage)
+		if memo is not None and memo[0] == fingerprint:
+			self.profile.count('stage cache hits')
+			return memo[1]
+		return None
+
+	def store(self, stage, fingerprint, result):
+		self.recomputed.append(stage)
+		self.memos[stage] = (fingerprint, result)
+		return result
+
+	def preload(self, stage, fingerprint, result):
+		# hand over a result computed ahead of time, unless the stage already has it.
+		memo = self.memos.get(stage)
+		if memo is None or memo[0] != fingerprint:
+			self.memos[stage] = (fingerprint, result)
+
+	def layout(self, glyphs, parameters, width, height, upm):
+		self.recomputed = []
+
+		# 1. metrics: the glyph sequence resolved into unique glyphs, and their layers
+		#    and advance widths per style.
+		stamps = parameters['stamps']
+		metrics_fingerprint = self.get_metrics_fingerprint(glyphs, parameters)
+		metrics = self.lookup('metrics', metrics_fingerprint)
+		if metrics is None:
+			metrics = self.store('metrics', metrics_fingerprint, self.get_metrics(glyphs, parameters))
+		else:
+			refetched = metrics.refresh(parameters['exports'], stamps)
+			if refetched > 0:
+				self.recomputed.append('metrics (%d layers)' % refetched)
+
+		# which glyphs each style has is settled here, so the layout never has to check.
+		metrics.prepare_styles(parameters['instances'])
+
+		# 2. line breaking depends on the advance widths, the styles, sizes and the horizontal margins.
+		gaps = parameters['gaps']
+		lines_fingerprint = (
+			metrics_fingerprint,
+			metrics.widths_version,
+			parameters['mode'],
+			tuple(parameters['instances']),
+			tuple(parameters['point_sizes']),
+			gaps['left'],
+			gaps['right'],
+			width,
+			upm)
+		lines = self.lookup('lines', lines_fingerprint)
+
+		# 3. pagination adds the vertical margins and gaps.
+		pages_fingerprint = (lines_fingerprint, gaps['top'], gaps['bottom'], gaps['line'], gaps['block'], height)
+		layout = self.lookup('pages', pages_fingerprint)
+		if layout is None:
+			with self.profile.stage('layout'):
+				layout = PROOFING_LAYOUTS[parameters['mode']](glyphs, parameters, width, height, upm, metrics=metrics, lines=lines, profile=self.profile)
+			if lines is None:
+				self.store('lines', lines_fingerprint, layout.lines)
+			self.store('pages', pages_fingerprint, layout)
+
+		# 4. the rendered document also depends on the outlines, which change with every glyph
+		#    edit. not a stage of its own, but what a rendered document is checked against.
+		self.fingerprints['render'] = (pages_fingerprint, tuple(stamps.get(glyph_name) for glyph_name in metrics.glyph_names), stamps.get(metrics.fallback))
+
+		return layout
+
+	def get_metrics_fingerprint(self, glyphs, parameters):
+		# the interpolated styles are identified by their interpolation keys,
+		# since proxies are replaced whenever a glyph is edited.
+		glyph_names = tuple(glyph.name for glyph in glyphs[0])
+		exports = tuple((style_name, parameters['export_keys'][style_name]) for style_name in sorted(set(parameters['instances'])))
+		return (glyph_names, exports, parameters['fallback'])
+
+	def get_metrics(self, glyphs, parameters, profile=None):
+		# new metrics for a proof, with no layers fetched yet. metrics built off the proof
+		# worker's thread take a profile of their own, since a profile times one thread.
+		profile = profile if profile is not None else self.profile
+		return OCCProofingMetrics(glyphs[0], parameters['exports'], profile, parameters['stamps'], self.disk_cache, parameters['export_keys'], parameters['fallback'])
+
+	def report(self):
+		return '[pipeline] recomputed: %s' % (', '.join(self.recomputed) if len(self.recomputed) > 0 else 'nothing')
@@ -1,18 +1,42 @@
+import os
 from GlyphsApp import Glyphs
+from interpolation import DEFAULT_INTERPOLATION_CACHE_SIZE
+from store import DEFAULT_DISK_CACHE_LIMIT
+
+# drawn in place of a glyph a style doesn't have. empty for a placeholder box.
+DEFAULT_FALLBACK_GLYPH = '.notdef'
 
 
 class OCCTemplatePreferences():
 	def __init__(self):
 		self.templatePaths = []
 		self.debugMode = False
+		self.profileDirectory = None
+		self.traceMemory = False
+		self.interpolationCacheSize = DEFAULT_INTERPOLATION_CACHE_SIZE
+		self.cacheDirectory = None
+		self.diskCacheLimit = DEFAULT_DISK_CACHE_LIMIT
+		self.fallbackGlyph = DEFAULT_FALLBACK_GLYPH
 		self.loadPreferences()
 
 	def loadPreferences(self):
 		Glyphs.registerDefault("com.OCC.ProofingTool.templatefiles", [])
 		Glyphs.registerDefault("com.OCC.ProofingTool.debug", False)
+		Glyphs.registerDefault("com.OCC.ProofingTool.profiledirectory", os.path.expanduser("~/Library/Logs/ProofingTool"))
+		Glyphs.registerDefault("com.OCC.ProofingTool.tracememory", False)
+		Glyphs.registerDefault("com.OCC.ProofingTool.interpolationcachesize", DEFAULT_INTERPOLATION_CACHE_SIZE)
+		Glyphs.registerDefault("com.OCC.ProofingTool.cachedirectory", os.path.expanduser("~/Library/Caches/ProofingTool"))
+		Glyphs.registerDefault("com.OCC.ProofingTool.diskcachelimit", DEFAULT_DISK_CACHE_LIMIT)
+		Glyphs.registerDefault("com.OCC.ProofingTool.fallbackglyph", DEFAULT_FALLBACK_GLYPH)
 		try:
 			self.templatePaths = Glyphs.defaults["com.OCC.ProofingTool.templatefiles"]
 			self.debugMode = Glyphs.defaults["com.OCC.ProofingTool.debug"]
+			self.profileDirectory = Glyphs.defaults["com.OCC.ProofingTool.profiledirectory"]
+			self.traceMemory = bool(Glyphs.defaults["com.OCC.ProofingTool.tracememory"])
+			self.interpolationCacheSize = int(Glyphs.defaults["com.OCC.ProofingTool.interpolationcachesize"])
+			self.cacheDirectory = Glyphs.defaults["com.OCC.ProofingTool.cachedirectory"]
+			self.diskCacheLimit = int(Glyphs.defaults["com.OCC.ProofingTool.diskcachelimit"])
+			self.fallbackGlyph = str(Glyphs.defaults["com.OCC.ProofingTool.fallbackglyph"] or '')
 			if len(self.templatePaths) < 1:
 				print('It looks like there aren’t previous templates to load. Please create a new template in the Edit tab or load a template file for your font.')
 				self.templatePaths = []
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import tracemalloc
+from datetime import datetime
+from timeit import default_timer
+from contextlib import contextmanager
+
+# The stages a proof run is timed in, in pipeline order.
+PROFILE_STAGES = ['interpolation', 'metrics', 'layout', 'paths', 'render', 'pdf']
+
+
+class OCCProofingProfile(object):
+	# Per-stage timings, counters and peak memory for one proof run at a time.
+	# When disabled, every call is a no-op, so instrumentation can stay in the hot paths.
+	#
+	# Memory is only traced when asked for, since tracing slows down every Python
+	# allocation, and with it the timings. It only sees Python's own allocations,
+	# not the memory Cocoa and Quartz use while rendering.
+	#
+	# Stage timings are exclusive: time spent in a stage entered from inside another
+	# stage (layers interpolated on demand while paginating, say) is only counted
+	# towards the innermost stage, so no time is counted twice.
+
+	def __init__(self, enabled=False, trace_memory=False):
+		self.enabled = enabled
+		self.trace_memory = trace_memory
+		self.run = None
+		self.run_started = None
+		self.stack = []
+
+	def start(self, info=None):
+		self.run = {
+			'started': datetime.now().isoformat(),
+			'info': dict(info) if info is not None else {},
+			'timings': dict((stage, 0.0) for stage in PROFILE_STAGES),
+			'counters': {},
+			'total': 0.0,
+			'peak_memory': None
+		}
+		self.stack = []
+		self.run_started = default_timer()
+		if self.enabled and self.trace_memory:
+			tracemalloc.start()
+
+	def stop(self):
+		if self.run is None:
+			return None
+		self.run['total'] = default_timer() - self.run_started
+		if self.enabled and self.trace_memory and tracemalloc.is_tracing():
+			self.run['peak_memory'] = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+		return self.run
+
+	@contextmanager
+	def stage(self, name):
+		if not self.enabled or self.run is None:
+			yield
+			return
+
+		now = default_timer()
+		if len(self.stack) > 0:
+			# pause the enclosing stage.
+			parent, parent_started = self.stack[-1]
+			self.run['timings'][parent] = self.run['timings'].get(parent, 0.0) + now - parent_started
+		self.stack.append((name, now))
+		try:
+			yield
+		finally:
+			name, started = self.stack.pop()
+			now = default_timer()
+			self.run['timings'][name] = self.run['timings'].get(name, 0.0) + now - started
+			if len(self.stack) > 0:
+				# resume the enclosing stage.
+				self.stack[-1] = (self.stack[-1][0], now)
+
+	def count(self, name, amount=1):
+		if self.enabled and self.run is not None:
+			self.run['counters'][name] = self.run['counters'].get(name, 0) + amount
+
+	def report(self):
+		if self.run is None:
+			return []
+		lines = []
+		for stage, seconds in self.run['timings'].items():
+			lines.append('[profile] %s: %.03f seconds' % (stage, seconds))
+		lines.append('[profile] total: %.03f seconds' % self.run['total'])
+		for name, amount in sorted(self.run['counters'].items()):
+			lines.append('[profile] %s: %d' % (name, amount))
+		if self.run['peak_memory'] is not None:
+			lines.append('[profile] peak memory (Python allocations only): %.01f MB' % (self.run['peak_memory'] / (1024.0 * 1024.0)))
+		return lines
+
+	def dump(self, directory):
+		# Write the last run to its own JSON file in directory, and return its path.
+		if self.run is None:
+			return None
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		filename = 'proof-%s.json' % datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+		path = os.path.join(directory, filename)
+		with open(path, 'w') as file:
+			json.dump(self.run, file, indent=4, default=str)
+		return path
@@ -1,20 +1,40 @@
-from GlyphsApp import Glyphs
+import os
+import objc
+import shutil
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from GlyphsApp import Glyphs, UPDATEINTERFACE
 # from GlyphsApp.UI import *
-from timeit import default_timer
 from vanilla import Window, TextBox
 # from vanilla.dialogs import putFile
 from datetime import datetime
+from PyObjCTools.AppHelper import callAfter, callLater
 
 from drawBot.drawBotDrawingTools import _drawBotDrawingTool
-from drawBot.context.drawBotContext import DrawBotContext
 from drawBot.ui.drawView import DrawView
 
-from layout import PROOFING_LAYOUTS
 from parameters import OCCParametersView
+from preferences import OCCTemplatePreferences
+from pipeline import OCCProofingPipeline
+from cache import OCCOutlineCache
+from profiling import OCCProofingProfile
+from store import OCCDiskCache
+from drawing import OCCDrawBotRenderer, flattenBezierPath
+from renderers import OCCPDFRenderer, get_overlay_text, get_overlay_lines, get_placeholder
 
-TEXT_PLACEMENT = 20
+ELEMENT_PADDING = 8
+HEIGHT_STATUS = 20
 WINDOW_WIDTH = 500  # In PIXELS
-TIMING = False  # For performance-testing how long proofs take to generate
+WATCH_DEBOUNCE = 0.5  # seconds without edits before a watched proof is updated
+PREWARM_WORKERS = max(1, min(4, os.cpu_count() or 1))
+PREWARM_CHUNK = 128  # glyphs interpolated per prewarming task
+
+
+class OCCProofCancelled(Exception):
+	# raised inside a proof worker once a newer proof has been requested.
+	pass
 
 
 class OCCProofingTool:
@@ -36,6 +56,7 @@ class OCCProofingTool:
 		self.drawView = DrawView((0, 0, self.window_width, -0))
 		self.mainWindow.drawing = self.drawView
 		self.mainWindow.drawing.introText = TextBox((0, self.window_height / 2, self.window_width, 50), "Select a template or load a new template (+) to apply.", alignment="center")
+		self.mainWindow.drawing.status = TextBox((ELEMENT_PADDING, -HEIGHT_STATUS, -ELEMENT_PADDING, HEIGHT_STATUS), "", sizeStyle="small")
 		self.kerning = False
 		self.debug = False
 
@@ -43,92 +64,481 @@ class OCCProofingTool:
 
 		self.parameters = {}
 
+		# outlines are shared across proofs, and rebuilt only for glyphs that changed,
+		# as told by their change stamps.
+		self.outlines = OCCOutlineCache()
+
+		# widths and outlines also persist on disk across sessions, when the cache can be opened.
+		self.preferences = OCCTemplatePreferences()
+		self.diskCache = self.openDiskCache()
+
+		# per-stage timings and counters, collected while the Debug checkbox is on.
+		self.profile = OCCProofingProfile()
+		self.pipeline = OCCProofingPipeline(self.profile, self.diskCache)
+
+		# proofs are drawn through the DrawBot renderer, which keeps the glyph sheets it
+		# draws the outlines into across proofs, and only draws a sheet again when one of
+		# its outlines changed.
+		self.renderDirectory = tempfile.mkdtemp(prefix='ProofingTool-')
+		self.renderer = OCCDrawBotRenderer(self.width, self.height, self.renderDirectory, self.profile)
+
+		# proofs are laid out and rendered on a worker thread. every request bumps the
+		# generation, which cancels any proof still in flight; the lock keeps a single
+		# proof at a time inside the (shared) drawBot drawing.
+		self.generation = 0
+		self.renderLock = threading.Lock()
+
+		# the last complete document, with the fingerprint it was rendered for.
+		self.document = None
+
+		# missing glyphs are reported once, until the set of missing glyphs changes.
+		self.missingReported = None
+
+		# in watch mode, every interface update schedules a check for glyph edits;
+		# only the last check of a burst of updates actually runs.
+		self.watching = False
+		self.watchCount = 0
+
+		# selecting a template interpolates its styles in the background;
+		# selecting another one abandons the work still queued for the last.
+		self.prewarmCount = 0
+
 		self.parametersView = OCCParametersView(
 			self.window_width,
 			self.window_height,
 			self.mainWindow,
 			parametersChangedCallback=self.updateParametersAndRedraw,
 			saveProofCallback=self.saveProof,
-			printProofCallback=self.printProof)
+			printProofCallback=self.printProof,
+			watchModeCallback=self.setWatchMode,
+			templateLoadedCallback=self.prewarm,
+			preferences=self.preferences)
 
+		self.mainWindow.bind("close", self.windowClosed)
 		self.mainWindow.open()
 
+	def windowClosed(self, sender):
+		self.setWatchMode(False)
+		self.cancelProof()
+		self.prewarmCount += 1
+		with self.renderLock:
+			if self.diskCache is not None:
+				self.diskCache.commit()
+				self.diskCache.close()
+				self.diskCache = None
+		shutil.rmtree(self.renderDirectory, ignore_errors=True)
+
+	def openDiskCache(self):
+		if self.preferences.cacheDirectory is None:
+			return None
+		try:
+			path = os.path.join(self.preferences.cacheDirectory, 'glyphs.sqlite')
+			font_identity = Glyphs.font.filepath if Glyphs.font.filepath is not None else Glyphs.font.familyName
+			return OCCDiskCache(path, font_identity, self.preferences.diskCacheLimit)
+		except Exception as error:
+			print('[disk cache] couldn’t open the disk cache, continuing without it: %s' % error)
+			return None
+
+	def setWatchMode(self, watching):
+		if watching and not self.watching:
+			Glyphs.addCallback(self.interfaceUpdated, UPDATEINTERFACE)
+		elif not watching and self.watching:
+			Glyphs.removeCallback(self.interfaceUpdated)
+			self.watchCount += 1
+		self.watching = watching
+
+	def interfaceUpdated(self, sender=None):
+		# interface updates come in bursts while editing, so the check waits for a pause.
+		self.watchCount += 1
+		callLater(WATCH_DEBOUNCE, self.checkForEdits, self.watchCount)
+
+	def checkForEdits(self, watchCount):
+		# Re-proof the last proof's glyphs and settings, if any of its glyphs, or the
+		# masters, changed since. The pipeline then only redoes the work for those glyphs,
+		# and the renderer replays every page whose content hash is unchanged.
+		if watchCount != self.watchCount or not self.watching or 'stamps' not in self.parameters:
+			return
+		parameters = self.parametersView.updateExports(self.parameters, self.glyphs)
+		if parameters['stamps'] != self.parameters['stamps'] or parameters['export_keys'] != self.parameters['export_keys']:
+			self.parameters = parameters
+			self.requestProof()
+
 	def updateParametersAndRedraw(self, parameters, glyphs):
 		self.parameters = parameters
 		self.glyphs = glyphs
-		self.draw(preview=True)
+		self.requestProof()
 
 	def saveProof(self, filename):
-		self.draw(preview=False)
-		_drawBotDrawingTool.saveImage(filename)
+		# saved pdfs are streamed to disk on a worker, rather than built as one document in memory.
+		# glyph edits are picked up here, on the main thread, like every other read of the font.
+		if 'stamps' not in self.parameters:
+			return
+		parameters = self.parametersView.updateExports(self.parameters, self.glyphs)
+		worker = threading.Thread(target=self.runExport, args=(filename, parameters, self.glyphs))
+		worker.daemon = True
+		worker.start()
+
+	def runExport(self, filename, parameters, glyphs):
+		# Write the proof to filename. The last rendered document is written out as it is,
+		# as long as nothing it depends on changed since. Otherwise the proof goes through
+		# the pure Python pdf renderer, which writes each outline once, as a form object
+		# every page of the file shares, and writes pages out as they're done, so memory
+		# stays flat however many pages the proof has. Waits for a proof in flight, whose
+		# document, or else outlines, it can usually reuse.
+		with objc.autorelease_pool():
+			exportDirectory = tempfile.mkdtemp(prefix='ProofingTool-export-')
+			try:
+				with self.renderLock:
+					report = []
+					try:
+						layout = self.pipeline.layout(glyphs, parameters, self.width, self.height, Glyphs.font.upm)
+						self.reportMissing(layout.metrics, report)
+						pageCount = len(layout.get())
+						exportPath = os.path.join(exportDirectory, 'proof.pdf')
+						if self.document is not None and self.document[0] == self.getDocumentFingerprint(parameters):
+							if not self.document[1].writeToFile_(exportPath):
+								raise IOError('couldn’t write %s' % exportPath)
+						else:
+							OCCPDFRenderer(self.width, self.height).render(
+								layout,
+								self.getOutlineGetter(layout, parameters),
+								exportPath,
+								overlay=self.getOverlay(parameters),
+								progress=lambda pageNumber: callAfter(self.showExportProgress, pageNumber, pageCount))
+					finally:
+						if self.diskCache is not None:
+							self.diskCache.commit()
+				shutil.move(exportPath, filename)
+				report.append('Saved %d pages to %s' % (pageCount, filename))
+			except Exception:
+				callAfter(print, traceback.format_exc())
+				callAfter(self.showExportProgress, None, None)
+				return
+			finally:
+				shutil.rmtree(exportDirectory, ignore_errors=True)
+		callAfter(self.showExported, report)
+
+	def showExportProgress(self, done, total):
+		if done is None:
+			self.mainWindow.drawing.status.set('')
+		else:
+			self.mainWindow.drawing.status.set('Saving page %d of %d...' % (done, total))
+
+	def showExported(self, report):
+		self.mainWindow.drawing.status.set('')
+		for line in report:
+			print(line)
+		print('Done.')
 
 	def printProof(self):
-		self.draw(preview=False)
-		_drawBotDrawingTool.printImage()
+		# the document is fetched on a worker, once any proof in flight is done with the
+		# render lock, and only printed on the main thread.
+		if 'stamps' not in self.parameters:
+			return
+		parameters = self.parametersView.updateExports(self.parameters, self.glyphs)
+		worker = threading.Thread(target=self.runPrint, args=(self.generation, parameters, self.glyphs))
+		worker.daemon = True
+		worker.start()
+
+	def runPrint(self, generation, parameters, glyphs):
+		with objc.autorelease_pool():
+			with self.renderLock:
+				try:
+					pdfDocument, report = self.getDocument(parameters, glyphs)
+				except Exception:
+					callAfter(print, traceback.format_exc())
+					return
+			callAfter(self.showPrint, generation, pdfDocument, report)
+
+	def showPrint(self, generation, pdfDocument, report):
+		_drawBotDrawingTool.printImage(pdfDocument)
+		self.showProof(generation, pdfDocument, report)
+
+	def getDocument(self, parameters, glyphs):
+		# The last rendered document, as long as nothing it depends on changed since.
+		# Otherwise the proof is rendered again. parameters are brought up to date with glyph
+		# edits by the caller, on the main thread.
+		self.pipeline.layout(glyphs, parameters, self.width, self.height, Glyphs.font.upm)
+		if self.document is not None and self.document[0] == self.getDocumentFingerprint(parameters):
+			return self.document[1], []
+		return self.draw(parameters, glyphs)
+
+	def getDocumentFingerprint(self, parameters):
+		# the render fingerprint covers the glyphs, their edits, and the layout settings.
+		return (self.pipeline.fingerprints['render'], parameters['title'], parameters['footer'])
+
+	def prewarm(self, parameters, glyphs):
+		# Interpolate every (style, glyph) pair a template needs on a small worker pool,
+		# as soon as it's selected, so that its proof starts from warm metrics.
+		self.prewarmCount += 1
+		worker = threading.Thread(target=self.runPrewarm, args=(self.prewarmCount, parameters, glyphs))
+		worker.daemon = True
+		worker.start()
+
+	def runPrewarm(self, prewarmCount, parameters, glyphs):
+		with objc.autorelease_pool():
+			try:
+				fingerprint = self.pipeline.get_metrics_fingerprint(glyphs, parameters)
+				# a disabled profile, since the proof worker may be timing stages of the shared one.
+				metrics = self.pipeline.get_metrics(glyphs, parameters, OCCProofingProfile())
+				glyph_count = len(metrics.glyph_names)
+				style_names = sorted(set(parameters['instances']))
+				for style_name in style_names:
+					metrics.prepare_style(style_name)
+
+				def warmGlyphs(style_name, start, end):
+					if prewarmCount != self.prewarmCount:
+						return
+					style_key = parameters['export_keys'][style_name]
+					with objc.autorelease_pool():
+						for glyph_id in range(start, end):
+							metrics.get_width(style_name, glyph_id)
+							# glyphs whose outlines are on disk don't need their layers at all.
+							if self.diskCache is None or not self.diskCache.has_outline(style_key, metrics.glyph_names[glyph_id], metrics.layer_stamps[style_name][glyph_id]):
+								metrics.get_glyph_layer(style_name, glyph_id)
+
+				tasks = [(style_name, start, min(start + PREWARM_CHUNK, glyph_count)) for style_name in style_names for start in range(0, glyph_count, PREWARM_CHUNK)]
+				with ThreadPoolExecutor(max_workers=PREWARM_WORKERS) as executor:
+					futures = [executor.submit(warmGlyphs, *task) for task in tasks]
+					for done, future in enumerate(as_completed(futures)):
+						future.result()
+						callAfter(self.showPrewarmProgress, prewarmCount, done + 1, len(tasks))
+
+				if prewarmCount == self.prewarmCount:
+					with self.renderLock:
+						metrics.profile = self.profile
+						self.pipeline.preload('metrics', fingerprint, metrics)
+						if self.diskCache is not None:
+							self.diskCache.commit()
+			except Exception:
+				callAfter(print, traceback.format_exc())
+			callAfter(self.showPrewarmProgress, prewarmCount, None, None)
 
-	def draw(self, preview=True):
+	def showPrewarmProgress(self, prewarmCount, done, total):
+		if prewarmCount != self.prewarmCount:
+			return
+		if done is None:
+			self.mainWindow.drawing.status.set('')
+		else:
+			self.mainWindow.drawing.status.set('Interpolating styles... %d%%' % (100 * done / total))
+
+	def requestProof(self):
 		self.mainWindow.drawing.introText.show(0)
+		generation = self.cancelProof()
+		worker = threading.Thread(target=self.runProof, args=(generation, self.parameters, self.glyphs))
+		worker.daemon = True
+		worker.start()
 
-		proof_mode = self.parameters['mode']
-		# choose the right layout class based on the layout mode: 'waterfall' or 'paragraphs'
-		if TIMING:
-			pre_generate_proof = default_timer()
-		proof = PROOFING_LAYOUTS[proof_mode](self.glyphs, self.parameters, self.width, self.height, Glyphs.font.upm).get()
-		if TIMING:
-			post_generate_proof = default_timer()
-
-		context = DrawBotContext()
-
-		if TIMING:
-			pre_render_proof = default_timer()
-		_drawBotDrawingTool.newDrawing()
-		_drawBotDrawingTool.fontSize(8)  # used to specify the font-size for the metadata at the bottom of the page.
-
-		# ==
-		# Render full document
-		# ==
-		now = datetime.now()
-		text = now.strftime("%m/%d/%Y %H:%M")
-		if self.parameters['title'] != '' and self.parameters['footer'] != '':
-			text = ('%s - %s' % (self.parameters['title'], self.parameters['footer'])) + ' - ' + text
-		elif self.parameters['title'] != '' or self.parameters['footer'] != '':
-			text = self.parameters['title'] + self.parameters['footer'] + ' - ' + text
-
-		# print('PROOF', proof)
-		# print('CANVAS', self.width, self.height)
-
-		for i, page in enumerate(proof if preview else proof):
-			_drawBotDrawingTool.newPage(self.width, self.height)
-			_drawBotDrawingTool.fontSize(8)
-
-			_drawBotDrawingTool.fill(1, 1, 1)
-			_drawBotDrawingTool.rect(0, 0, self.width, self.height)
-			_drawBotDrawingTool.fill(0, 0, 0)
-
-			for layer in page:
-				path = _drawBotDrawingTool.BezierPath(layer['path'].completeBezierPath)
-				path.scale(layer['scale'])
-				path.translate(layer['x'], layer['y'])
-				_drawBotDrawingTool.drawPath(path)
-
-			_drawBotDrawingTool.fill(0.5, 0.5, 0.5)
-
-			page = 'pg. %s' % str(i + 1)
-
-			if self.parameters['gaps']['bottom'] > TEXT_PLACEMENT:
-				_drawBotDrawingTool.text(text, (self.parameters['gaps']['left'], TEXT_PLACEMENT))
-				_drawBotDrawingTool.text(page, (self.width - self.parameters['gaps']['left'] - 20, TEXT_PLACEMENT))
-
-		# _drawBotDrawingTool.printImage()
-		# _drawBotDrawingTool.saveImage("/Users/nic/Desktop/proof.pdf")
-
-		_drawBotDrawingTool._drawInContext(context)
-		pdfDocument = context.getNSPDFDocument()
-		self.drawView.setPDFDocument(pdfDocument)
+	def cancelProof(self):
+		# a new generation makes every proof still in flight stop at its next check.
+		self.generation += 1
+		return self.generation
+
+	def checkGeneration(self, generation):
+		if generation is not None and generation != self.generation:
+			raise OCCProofCancelled()
+
+	def runProof(self, generation, parameters, glyphs):
+		with objc.autorelease_pool():
+			with self.renderLock:
+				try:
+					self.checkGeneration(generation)
+					pdfDocument, report = self.draw(parameters, glyphs, generation, progressive=True)
+				except OCCProofCancelled:
+					return
+				except Exception:
+					callAfter(print, traceback.format_exc())
+					return
+
+			# only the hand-off of the finished document happens on the main thread.
+			callAfter(self.showProof, generation, pdfDocument, report)
+
+	def reportProgress(self, generation, done, total, exact=True):
+		self.checkGeneration(generation)
+		callAfter(self.showProgress, generation, done, total, exact)
+
+	def showProgress(self, generation, done, total, exact):
+		# progress without a generation comes from a save, which isn't cancelled by newer proofs.
+		if generation is None or generation == self.generation:
+			if exact:
+				self.mainWindow.drawing.status.set('Rendering page %d of %d...' % (done, total))
+			else:
+				self.mainWindow.drawing.status.set('Rendering page %d of about %d...' % (done, total))
+
+	def showPreview(self, generation, pdfDocument):
+		# a partial document, shown while the rest of the proof is still rendering.
+		if generation == self.generation:
+			self.drawView.setPDFDocument(pdfDocument)
 
-		if TIMING:
-			post_render_proof = default_timer()
-			print('[profile] time to compile: %.03f seconds' % (post_generate_proof - pre_generate_proof))
-			print('[profile] time to render: %.03f seconds' % (post_render_proof - pre_render_proof))
-			print('[profile] done.\n')
+	def showProof(self, generation, pdfDocument, report):
+		if generation != self.generation:
+			return
+		self.mainWindow.drawing.status.set('')
+		self.drawView.setPDFDocument(pdfDocument)
+		for line in report:
+			print(line)
 		print('Done.')
+
+	def getOutlineGetter(self, layout, parameters):
+		# get_outline(style_id, glyph_id) for the renderer: a glyph's flattened outline, or
+		# None for an empty glyph. outlines are shared across proofs, for as long as their
+		# glyph's stamp, and the interpolation key of their style, are unchanged.
+		def getOutline(style_id, glyph_id):
+			style_name = layout.style_names[style_id]
+			glyph_name = layout.glyph_names[glyph_id]
+			export_key = parameters['export_keys'][style_name]
+			# the stamps of glyphs drawn as a stand in include the stand in's stamp.
+			stamp = layout.metrics.layer_stamps[style_name][glyph_id]
+			outline = self.outlines.get(style_name, glyph_name, (export_key, stamp))
+			if outline is None:
+				outline = self.outlines.set(style_name, glyph_name, (export_key, stamp), self.buildOutline(layout, style_id, glyph_id, export_key, stamp))
+			return outline if len(outline[0]) > 0 else None
+
+		return getOutline
+
+	def getOutlineVersions(self, layout, parameters):
+		# what each outline was built from, indexed by [style_id][glyph_id], so the
+		# renderer can tell which of the outlines it drew before are unchanged.
+		versions = []
+		for style_name in layout.style_names:
+			export_key = parameters['export_keys'][style_name]
+			versions.append([(export_key, stamp) for stamp in layout.metrics.layer_stamps[style_name]])
+		return versions
+
+	def buildOutline(self, layout, style_id, glyph_id, export_key, stamp):
+		# A flattened outline from the disk cache, or else from its interpolated layer,
+		# in which case it's also stored on disk for the next session. the layer is only
+		# fetched, and interpolated, when the disk cache misses.
+		glyph_name = layout.glyph_names[glyph_id]
+		style_name = layout.style_names[style_id]
+		if layout.metrics.sources[style_name][glyph_id] is None:
+			return get_placeholder(layout.metrics.get_width(style_name, glyph_id), 1.0 / layout.em_per_u)
+
+		if self.diskCache is not None:
+			flattened = self.diskCache.get_outline(export_key, glyph_name, stamp)
+			if flattened is not None:
+				return flattened
+
+		shape = layout.get_shape(style_id, glyph_id)
+		with self.profile.stage('paths'):
+			bezierPath = shape.completeBezierPath
+			flattened = flattenBezierPath(bezierPath)
+			if flattened is None:
+				# elements outlines don't hold, like quadratic curves, are flattened into lines.
+				flattened = flattenBezierPath(bezierPath.bezierPathByFlatteningPath())
+			if self.diskCache is not None:
+				self.diskCache.set_outline(export_key, glyph_name, stamp, *flattened)
+			return flattened
+
+	def reportMissing(self, metrics, report):
+		# one summary of the glyphs the proof's styles don't have, rather than a line per lookup.
+		missing = metrics.get_missing()
+		if missing == self.missingReported:
+			return
+		self.missingReported = missing
+		if len(missing) == 0:
+			return
+		standIn = metrics.fallback if metrics.fallback is not None else 'a placeholder box'
+		report.append('⚠️ %d glyphs are missing from some styles, and are drawn as %s:' % (len(missing), standIn))
+		for glyph_name in metrics.glyph_names:
+			if glyph_name in missing:
+				report.append('\t%s\tmissing from %s' % (glyph_name, ', '.join(missing[glyph_name])))
+
+	def getOverlayText(self, parameters):
+		return get_overlay_text(parameters, datetime.now())
+
+	def draw(self, parameters, glyphs, generation=None, progressive=False):
+		# Lay out and render a proof, and return its pdf document along with any report
+		# lines to print. Runs on the proof worker, or under the render lock for save and print.
+		report = []
+		debug = bool(self.parametersView.preferences.debugMode)
+
+		self.profile.enabled = debug
+		self.profile.trace_memory = self.parametersView.preferences.traceMemory
+		self.profile.start(self.getProfileInfo(parameters, glyphs))
+		if self.diskCache is not None:
+			self.diskCache.reset_counters()
+
+		try:
+			# choose the right layout class based on the layout mode: 'waterfall' or 'paragraphs'.
+			# the pipeline only re-runs the layout stages whose inputs changed since the last proof.
+			layout = self.pipeline.layout(glyphs, parameters, self.width, self.height, Glyphs.font.upm)
+			self.reportMissing(layout.metrics, report)
+
+			self.checkGeneration(generation)
+			self.outlines.reset_counters()
+			# 5. every page is drawn into a single document, placing outlines from the renderer's
+			#    glyph sheets, and stamped with the metadata overlay, which carries the current time.
+			#    pages whose content hash is unchanged since the last proof replay what they placed.
+			with self.profile.stage('render'):
+				self.renderer.render(
+					layout,
+					self.getOutlineGetter(layout, parameters),
+					None,
+					overlay=self.getOverlay(parameters),
+					progress=self.getProgress(layout, generation, progressive),
+					versions=self.getOutlineVersions(layout, parameters),
+					check=lambda: self.checkGeneration(generation))
+			pdfDocument = self.renderer.document
+
+			pages = layout.get()
+			self.profile.count('pages', len(pages))
+			self.profile.count('placements', sum(map(len, pages)))
+			self.profile.count('outline cache hits', self.outlines.hits)
+			self.profile.count('paths built', self.outlines.misses)
+			self.profile.count('glyph sheets drawn', self.renderer.sheets_drawn)
+			self.profile.count('pages reused', self.renderer.pages_reused)
+			self.document = (self.getDocumentFingerprint(parameters), pdfDocument)
+		finally:
+			# entries are content addressed, so even a cancelled proof's writes are worth keeping.
+			if self.diskCache is not None:
+				self.diskCache.commit()
+			self.profile.stop()
+
+		if debug:
+			report.append(self.pipeline.report())
+			report.append(self.outlines.report())
+			if self.diskCache is not None:
+				report.append(self.diskCache.report())
+			report.append(self.parametersView.interpolated_instances.report())
+			report.extend(self.profile.report())
+			try:
+				report.append('[profile] written to %s' % self.profile.dump(self.parametersView.preferences.profileDirectory))
+			except (IOError, OSError) as error:
+				report.append('[profile] couldn’t write the profile: %s' % error)
+
+		return pdfDocument, report
+
+	def getOverlay(self, parameters):
+		# the overlay lines of each page, for the renderer.
+		text = self.getOverlayText(parameters)
+		return lambda page_number: get_overlay_lines(parameters, text, self.width, page_number)
+
+	def getProgress(self, layout, generation, progressive):
+		# Called by the renderer as each page is done, which stops a cancelled proof. The
+		# page total is estimated from the layout's line breaks until every page is laid out.
+		# In progressive mode, the preview is updated after the first page, and again each
+		# time the page count doubles, so the time to first page doesn't depend on the
+		# length of the proof.
+		previews = [1]
+
+		def progress(page_number):
+			total, exact = layout.get_page_count()
+			self.reportProgress(generation, page_number, total, exact)
+			if progressive and page_number == previews[0]:
+				previews[0] *= 2
+				callAfter(self.showPreview, generation, self.renderer.snapshot())
+
+		return progress
+
+	def getProfileInfo(self, parameters, glyphs):
+		# context for comparing profiles across Glyphs versions, fonts and proof settings.
+		return {
+			'glyphs_version': '%s (%s)' % (Glyphs.versionNumber, Glyphs.buildNumber),
+			'font': Glyphs.font.familyName,
+			'upm': Glyphs.font.upm,
+			'mode': parameters['mode'],
+			'styles': list(parameters['instances']),
+			'point_sizes': list(parameters['point_sizes']),
+			'glyph_count': len(glyphs[0])
+		}
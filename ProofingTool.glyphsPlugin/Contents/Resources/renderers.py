@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+import os
+import zlib
+from array import array
+
+from store import MOVE_TO, LINE_TO, CURVE_TO, CLOSE_PATH, OPERATION_POINTS
+
+TEXT_PLACEMENT = 20
+OVERLAY_SIZE = 8
+OVERLAY_GRAY = 0.5
+PLACEHOLDER_HEIGHT = 0.7  # in ems, the height of the box drawn for a glyph with no fallback
+PLACEHOLDER_STROKE = 0.05  # in ems
+UNDEFINED = object()  # marks an outline that hasn't been defined with the renderer yet
+
+
+def get_overlay_text(parameters, now):
+	# the metadata stamped at the bottom of every page.
+	text = now.strftime("%m/%d/%Y %H:%M")
+	if parameters['title'] != '' and parameters['footer'] != '':
+		text = ('%s - %s' % (parameters['title'], parameters['footer'])) + ' - ' + text
+	elif parameters['title'] != '' or parameters['footer'] != '':
+		text = parameters['title'] + parameters['footer'] + ' - ' + text
+	return text
+
+
+def get_overlay_lines(parameters, text, width, page_number):
+	# (text, x, y) for each line of the overlay of one page, which is left off when
+	# the bottom margin has no room for it.
+	if parameters['gaps']['bottom'] <= TEXT_PLACEMENT:
+		return []
+	page = 'pg. %s' % str(page_number)
+	return [
+		(text, parameters['gaps']['left'], TEXT_PLACEMENT),
+		(page, width - parameters['gaps']['left'] - 20, TEXT_PLACEMENT)
+	]
+
+
+def get_placeholder(width, upm):
+	# An open box, as an outline, for a glyph neither a style nor its fallback glyph are in.
+	# the inner rectangle runs the other way around, leaving the box open.
+	height = PLACEHOLDER_HEIGHT * upm
+	stroke = PLACEHOLDER_STROKE * upm
+	operations = bytearray([MOVE_TO, LINE_TO, LINE_TO, LINE_TO, CLOSE_PATH, MOVE_TO, LINE_TO, LINE_TO, LINE_TO, CLOSE_PATH])
+	coordinates = array('f', [
+		stroke, 0, width - stroke, 0, width - stroke, height, stroke, height,
+		2 * stroke, stroke, 2 * stroke, height - stroke, width - 2 * stroke, height - stroke, width - 2 * stroke, stroke])
+	return operations, coordinates
+
+
+def get_outline_bounds(operations, coordinates):
+	# the control point bounds of an outline, which contain the outline itself.
+	if len(coordinates) == 0:
+		return None
+	xs = coordinates[0::2]
+	ys = coordinates[1::2]
+	return min(xs), min(ys), max(xs), max(ys)
+
+
+def format_number(value):
+	text = '%.3f' % value
+	text = text.rstrip('0').rstrip('.')
+	return text if text != '-0' else '0'
+
+
+class OCCRenderer(object):
+	# Turns a layout's pages into a document. A renderer only sees the laid out
+	# pages, and outlines as the (operations, coordinates) the disk cache stores
+	# (see store.py), so it doesn't depend on Glyphs, or on a user interface.
+	#
+	# `render` walks the pages, and calls the drawing primitives subclasses
+	# implement: each outline is defined once, and every placement refers to it
+	# through a transform. Outlines are defined as they're first placed, unless a
+	# subclass defines them some other way, in `prepare` or `render_page`.
+	#
+	# `outputs` lists the files written since the last `begin`.
+
+	def __init__(self, width, height):
+		self.width = width
+		self.height = height
+		self.outputs = []
+
+	def render(self, layout, get_outline, path, overlay=None, progress=None, versions=None, check=None):
+		# get_outline(style_id, glyph_id) returns an outline, or None for an empty glyph.
+		# overlay(page_number) returns the (text, x, y) lines stamped over a page, and
+		# progress(page_number) is called as each page is done. versions, indexed by
+		# [style_id][glyph_id], tell a renderer that's kept across renders which outlines
+		# are unchanged since. check() is called between the longer steps of a page, and
+		# may raise to stop the render. returns the page count.
+		handles = self.prepare(layout, get_outline, versions, check)
+		page_count = 0
+		self.begin(path)
+		try:
+			for page in layout.iter_pages():
+				page_count += 1
+				self.render_page(page, handles, get_outline, page_count, overlay)
+				if progress is not None:
+					progress(page_count)
+		except BaseException:
+			self.abort()
+			raise
+		self.end()
+		return page_count
+
+	def prepare(self, layout, get_outline, versions=None, check=None):
+		# the handles of outlines defined ahead of the pages, by (style_id, glyph_id).
+		return {}
+
+	def render_page(self, page, handles, get_outline, page_number, overlay=None):
+		# draw one page between begin and end, defining the outlines it places that
+		# aren't in handles yet.
+		self.begin_page()
+		for glyph_id, style_id, x, y, scale in page.placements():
+			handle = handles.get((style_id, glyph_id), UNDEFINED)
+			if handle is UNDEFINED:
+				outline = get_outline(style_id, glyph_id)
+				handle = self.define_outline(*outline) if outline is not None else None
+				handles[(style_id, glyph_id)] = handle
+			if handle is not None:
+				self.place(handle, x, y, scale)
+		self.stamp(overlay, page_number)
+		self.end_page()
+
+	def stamp(self, overlay, page_number):
+		# the overlay lines of one page, over its content.
+		if overlay is not None:
+			for text, x, y in overlay(page_number):
+				self.text(text, x, y, OVERLAY_SIZE, OVERLAY_GRAY)
+
+	def begin(self, path):
+		raise NotImplementedError
+
+	def define_outline(self, operations, coordinates):
+		# returns a handle that placements of the outline refer to, or None if it's empty.
+		raise NotImplementedError
+
+	def begin_page(self):
+		raise NotImplementedError
+
+	def place(self, handle, x, y, scale):
+		raise NotImplementedError
+
+	def text(self, text, x, y, size, gray):
+		raise NotImplementedError
+
+	def end_page(self):
+		raise NotImplementedError
+
+	def end(self):
+		raise NotImplementedError
+
+	def abort(self):
+		# called instead of end when rendering stopped part way. by default, the pages
+		# drawn so far are still written out.
+		self.end()
+
+
+class OCCPDFRenderer(OCCRenderer):
+	# A pure Python pdf writer. Each outline is written once, as a form object,
+	# and placed on pages by reference. Objects are written to the file as soon as
+	# they're complete, so memory only holds the page being drawn, however long the
+	# document gets.
+	extension = '.pdf'
+
+	CATALOG = 1
+	PAGES = 2
+	FONT = 3
+
+	def begin(self, path):
+		self.file = open(path, 'wb')
+		self.outputs = [path]
+		self.offsets = {}
+		self.next_id = 4
+		self.page_ids = []
+		self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+		self.write_object(self.FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+	def get_id(self):
+		object_id = self.next_id
+		self.next_id += 1
+		return object_id
+
+	def write_object(self, object_id, body):
+		self.offsets[object_id] = self.file.tell()
+		self.file.write(b'%d 0 obj\n' % object_id)
+		self.file.write(body)
+		self.file.write(b'\nendobj\n')
+
+	def write_stream(self, object_id, dictionary, content):
+		data = zlib.compress(content)
+		body = b'<< %s /Filter /FlateDecode /Length %d >>\nstream\n' % (dictionary, len(data))
+		self.write_object(object_id, body + data + b'\nendstream')
+
+	def define_outline(self, operations, coordinates):
+		bounds = get_outline_bounds(operations, coordinates)
+		if bounds is None:
+			return None
+		content = []
+		index = 0
+		for operation in operations:
+			count = OPERATION_POINTS[operation]
+			points = ' '.join(format_number(value) for value in coordinates[index:index + 2 * count])
+			if operation == MOVE_TO:
+				content.append(points + ' m')
+			elif operation == LINE_TO:
+				content.append(points + ' l')
+			elif operation == CURVE_TO:
+				content.append(points + ' c')
+			else:
+				content.append('h')
+			index += 2 * count
+		content.append('f')
+		object_id = self.get_id()
+		bbox = ' '.join(format_number(value) for value in bounds)
+		self.write_stream(object_id, b'/Type /XObject /Subtype /Form /BBox [%s]' % bbox.encode('ascii'), '\n'.join(content).encode('ascii'))
+		return object_id
+
+	def begin_page(self):
+		self.content = []
+		self.forms = set()
+
+	def place(self, handle, x, y, scale):
+		self.forms.add(handle)
+		self.content.append('q %s 0 0 %s %s %s cm /G%d Do Q' % (format_number(scale), format_number(scale), format_number(x), format_number(y), handle))
+
+	def text(self, text, x, y, size, gray):
+		escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+		self.content.append('q BT /F1 %s Tf %s g %s %s Td (%s) Tj ET Q' % (format_number(size), format_number(gray), format_number(x), format_number(y), escaped))
+
+	def end_page(self):
+		content_id = self.get_id()
+		page_id = self.get_id()
+		content = '\n'.join(self.content).encode('cp1252', errors='replace')
+		self.write_stream(content_id, b'', content)
+		forms = ' '.join('/G%d %d 0 R' % (form, form) for form in sorted(self.forms))
+		self.write_object(page_id, (
+			'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Contents %d 0 R '
+			'/Resources << /Font << /F1 %d 0 R >> /XObject << %s >> >> >>' % (
+				self.PAGES, format_number(self.width), format_number(self.height), content_id, self.FONT, forms)).encode('ascii'))
+		self.page_ids.append(page_id)
+		self.content = None
+		self.forms = None
+
+	def end(self):
+		kids = ' '.join('%d 0 R' % page_id for page_id in self.page_ids)
+		self.write_object(self.PAGES, ('<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_ids))).encode('ascii'))
+		self.write_object(self.CATALOG, ('<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES).encode('ascii'))
+
+		xref = self.file.tell()
+		self.file.write(b'xref\n0 %d\n0000000000 65535 f \n' % self.next_id)
+		for object_id in range(1, self.next_id):
+			self.file.write(b'%010d 00000 n \n' % self.offsets[object_id])
+		self.file.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_id, self.CATALOG, xref))
+		self.file.close()
+
+
+class OCCSVGRenderer(OCCRenderer):
+	# A pure Python svg writer. svg documents have a single page, so each page is
+	# written to its own file, numbered after the path given, and each defines the
+	# outlines it places once, and places them with <use>.
+	extension = '.svg'
+
+	def begin(self, path):
+		self.root, extension = os.path.splitext(path)
+		self.extension = extension if extension != '' else self.extension
+		self.paths = {}
+		self.outputs = []
+
+	def define_outline(self, operations, coordinates):
+		if len(operations) == 0:
+			return None
+		data = []
+		index = 0
+		for operation in operations:
+			count = OPERATION_POINTS[operation]
+			points = ' '.join(format_number(value) for value in coordinates[index:index + 2 * count])
+			if operation == MOVE_TO:
+				data.append('M' + points)
+			elif operation == LINE_TO:
+				data.append('L' + points)
+			elif operation == CURVE_TO:
+				data.append('C' + points)
+			else:
+				data.append('Z')
+			index += 2 * count
+		handle = 'g%d' % len(self.paths)
+		self.paths[handle] = ' '.join(data)
+		return handle
+
+	def begin_page(self):
+		self.content = []
+		self.uses = set()
+
+	def place(self, handle, x, y, scale):
+		# svg's y axis points down, so outlines are flipped back up by a negative y scale.
+		self.uses.add(handle)
+		self.content.append('<use href="#%s" transform="matrix(%s 0 0 %s %s %s)"/>' % (
+			handle, format_number(scale), format_number(-scale), format_number(x), format_number(self.height - y)))
+
+	def text(self, text, x, y, size, gray):
+		escaped = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+		level = int(round(255 * gray))
+		self.content.append('<text x="%s" y="%s" font-family="Helvetica, Arial, sans-serif" font-size="%s" fill="rgb(%d,%d,%d)">%s</text>' % (
+			format_number(x), format_number(self.height - y), format_number(size), level, level, level, escaped))
+
+	def end_page(self):
+		page_path = '%s-%d%s' % (self.root, len(self.outputs) + 1, self.extension)
+		with open(page_path, 'w', encoding='utf-8') as page_file:
+			page_file.write('<svg xmlns="http://www.w3.org/2000/svg" width="%s" height="%s" viewBox="0 0 %s %s">\n' % (
+				format_number(self.width), format_number(self.height), format_number(self.width), format_number(self.height)))
+			page_file.write('<rect width="100%" height="100%" fill="white"/>\n<defs>\n')
+			for handle in sorted(self.uses):
+				page_file.write('<path id="%s" d="%s"/>\n' % (handle, self.paths[handle]))
+			page_file.write('</defs>\n')
+			page_file.write('\n'.join(self.content))
+			page_file.write('\n</svg>\n')
+		self.outputs.append(page_path)
+		self.content = None
+		self.uses = None
+
+	def end(self):
+		pass
+
+
+RENDERERS = {
+	'pdf': OCCPDFRenderer,
+	'svg': OCCSVGRenderer
+}
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+
+def validate_template(template_name, template, instance_names, has_glyph, debug, messages):
+	# A template in the form the proofing tool works with, where every line has a style
+	# of instance_names and a whole number size, and every glyph passes has_glyph.
+	# Anything amiss is fixed or skipped, and reported in messages when debugging.
+	# `template` itself is left as it is, since it may be shared through a cache.
+
+	if 'name' in template:
+		name = template['name']
+	else:
+		if debug:
+			messages.append(f'[{template_name}]\t"{template_name}" does not have a template name specified. Naming it "{template_name}"')
+		name = template_name
+
+	default_style = None
+	default_size = 24
+
+	if 'style' in template:
+		if template['style'] in instance_names:
+			default_style = template['style']
+		else:
+			if debug:
+				messages.append(f'[{template_name}]\tthe template specifies a default style ({template["style"]}), but it’s not a style of the current typeface.')
+	else:
+		if debug:
+			messages.append(f'[{template_name}]\tthe template does not specify a default style.')
+
+	if 'size' in template:
+		if isinstance(template['size'], int):
+			default_size = template['size']
+		else:
+			if debug:
+				messages.append(f'[{template_name}]\tthe proof specifies a default size ({template["size"]}), but it’s not a whole number.')
+	else:
+		if debug:
+			messages.append(f'[{template_name}]\tthe template does not specify a default size.')
+
+	glyphs = []
+
+	if 'glyphs' in template:
+		if isinstance(template['glyphs'], list):
+			for g in template['glyphs']:
+				if g == "newGlyph" or has_glyph(g):
+					glyphs.append(g)
+				elif debug:
+					messages.append(f'[{template_name}]\t⚠️{g} does not exist in the current font and will be skipped.')
+		else:
+			if debug:
+				messages.append(f'[{template_name}]\tthe template provides a "glyphs" key, but it’s not a list of glyph names.')
+	else:
+		if debug:
+			messages.append(f'[{template_name}]\tthe template does not provide a "glyphs" key.')
+
+	if 'lines' in template:
+		lines = []
+		for linenum, line in enumerate(template['lines']):
+			line = dict(line)
+			if 'style' not in line:
+				if default_style is not None:
+					line['style'] = default_style
+				else:
+					if debug:
+						messages.append(f'[{template_name}]\tline {linenum + 1} has no style specified and no default style is set.')
+					continue
+
+			if line['style'] not in instance_names:
+				if default_style is not None:
+					if debug:
+						messages.append(f'[{template_name}]\t⚠️ line {linenum + 1} specifies "{line["style"]}," which is not an instance in this typeface. Replacing with the default "{default_style}".')
+					line['style'] = default_style
+				else:
+					if debug:
+						messages.append(f'[{template_name}]\t⚠️ line {linenum + 1} specifies "{line["style"]}," which is not an instance in this typeface. Since no valid default style is specified, we’re skipping the line.')
+					continue
+
+			if 'size' not in line:
+				if debug:
+					messages.append(f'[{template_name}]\tline {linenum + 1} has no size specified, setting default of {default_size}.')
+				line['size'] = default_size
+
+			if not isinstance(line['size'], int):
+				if debug:
+					messages.append(f'[{template_name}]\tline {linenum + 1} does not specify a whole number size, replacing it with the default ({default_size})...')
+				line['size'] = default_size
+
+			lines.append(line)
+	else:
+		if debug:
+			messages.append(f'[{template_name}]\t"{template_name}" does not have any lines specified.')
+		lines = []
+
+	proof = {
+		"margins": {
+			"left": 20,
+			"right": 70,
+			"top": 20,
+			"bottom": 100,
+		},
+		"gaps": {
+			"line": 20,
+			"block": 20
+		},
+		"mode": "waterfall",
+		"footer": ""
+	}
+
+	if 'proof' in template:
+		if 'margins' in template['proof']:
+			proof['margins']['left'] = template['proof']['margins']['left']
+			proof['margins']['right'] = template['proof']['margins']['right']
+			proof['margins']['top'] = template['proof']['margins']['top']
+			proof['margins']['bottom'] = template['proof']['margins']['bottom']
+
+		if 'gaps' in template['proof']:
+			proof['gaps']['line'] = template['proof']['gaps']['line']
+			proof['gaps']['block'] = template['proof']['gaps']['block']
+
+		if 'mode' in template['proof']:
+			proof['mode'] = template['proof']['mode']
+
+		if 'footer' in template['proof']:
+			proof['footer'] = template['proof']['footer']
+	else:
+		if debug:
+			messages.append(f'[{template_name}]\t"{template_name}" does not specify margin and gap information. Setting defaults.')
+
+	return {
+		"name": name,
+		"lines": lines,
+		"proof": proof,
+		"glyphs": glyphs
+	}
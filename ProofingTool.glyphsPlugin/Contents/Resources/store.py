@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import struct
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+DEFAULT_DISK_CACHE_LIMIT = 256 * 1024 * 1024  # bytes
+ENTRY_OVERHEAD = 64  # rough bytes per entry besides its outline, for the size bound
+WRITE_BATCH = 256  # entries held in memory before they're written out
+LOCK_TIMEOUT = 5.0  # seconds to wait for another connection's write to finish
+
+# path operations of a flattened outline.
+MOVE_TO = 0
+LINE_TO = 1
+CURVE_TO = 2
+CLOSE_PATH = 3
+OPERATION_POINTS = {MOVE_TO: 1, LINE_TO: 1, CURVE_TO: 3, CLOSE_PATH: 0}
+
+
+def get_token(value):
+	# A stable text form of a key or change stamp, the same from one session to the next.
+	if isinstance(value, (tuple, list)):
+		return '(%s)' % ','.join(get_token(item) for item in value)
+	if value is None or isinstance(value, (bool, int, float, str)):
+		return repr(value)
+	if hasattr(value, 'timeIntervalSince1970'):
+		return repr(float(value.timeIntervalSince1970()))
+	if hasattr(value, 'timestamp'):
+		return repr(float(value.timestamp()))
+	return str(value)
+
+
+def encode_outline(operations, coordinates):
+	# operation count, one byte per operation, then the coordinates as 32 bit floats.
+	return struct.pack('<I', len(operations)) + bytes(operations) + array('f', coordinates).tobytes()
+
+
+def decode_outline(data):
+	count = struct.unpack_from('<I', data)[0]
+	operations = bytearray(data[4:4 + count])
+	coordinates = array('f')
+	coordinates.frombytes(data[4 + count:])
+	return operations, coordinates
+
+
+class OCCDiskCache(object):
+	# Advance widths and flattened outlines of interpolated glyphs, kept in a single
+	# sqlite file across sessions. Entries are content addressed by a hash of the font,
+	# the style's interpolation key, the glyph name and its change stamp, so an edited
+	# glyph simply misses, and its old entry ages out: once the cached data grows past
+	# `limit` bytes, the least recently used entries are dropped.
+	#
+	# Reads and writes may come from several threads; a lock serializes them. The file
+	# may also be shared by several processes, so writes are held in memory, and written
+	# out WRITE_BATCH at a time, in short transactions, rather than holding the write lock
+	# for a whole proof. The file is in write-ahead logging mode, so reads never wait for
+	# a write. A read or write that still can't get the lock in time is given up on, which
+	# only costs a miss later on.
+
+	def __init__(self, path, font_identity, limit=DEFAULT_DISK_CACHE_LIMIT):
+		self.path = path
+		self.font_identity = font_identity
+		self.limit = limit
+		self.lock = threading.Lock()
+		self.used = {}
+		self.pending = {}
+
+		directory = os.path.dirname(path)
+		if directory != '' and not os.path.isdir(directory):
+			os.makedirs(directory)
+		self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute('CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, width REAL, outline BLOB, used REAL)')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+		self.connection.commit()
+		self.reset_counters()
+
+	def get_key(self, style_key, glyph_name, stamp):
+		key = get_token((self.font_identity, style_key, glyph_name, stamp))
+		return hashlib.sha1(key.encode('utf-8')).digest()
+
+	def read(self, query, key):
+		# one row, or None when there's none, or the file stayed locked for too long.
+		try:
+			return self.connection.execute(query, (key,)).fetchone()
+		except sqlite3.OperationalError:
+			self.failures += 1
+			return None
+
+	def get_width(self, style_key, glyph_name, stamp):
+		key = self.get_key(style_key, glyph_name, stamp)
+		with self.lock:
+			entry = self.pending.get(key)
+			if entry is not None and entry[0] is not None:
+				return entry[0]
+			row = self.read('SELECT width FROM entries WHERE key = ?', key)
+			if row is None or row[0] is None:
+				return None
+			self.width_hits += 1
+			self.used[key] = time.time()
+			return row[0]
+
+	def set_width(self, style_key, glyph_name, stamp, width):
+		self.write(self.get_key(style_key, glyph_name, stamp), 0, width)
+
+	def has_outline(self, style_key, glyph_name, stamp):
+		key = self.get_key(style_key, glyph_name, stamp)
+		with self.lock:
+			entry = self.pending.get(key)
+			if entry is not None and entry[1] is not None:
+				return True
+			row = self.read('SELECT outline IS NOT NULL FROM entries WHERE key = ?', key)
+			return row is not None and bool(row[0])
+
+	def get_outline(self, style_key, glyph_name, stamp):
+		# the (operations, coordinates) of a flattened outline, or None.
+		key = self.get_key(style_key, glyph_name, stamp)
+		with self.lock:
+			entry = self.pending.get(key)
+			if entry is not None and entry[1] is not None:
+				return decode_outline(entry[1])
+			row = self.read('SELECT outline FROM entries WHERE key = ?', key)
+			if row is None or row[0] is None:
+				return None
+			self.outline_hits += 1
+			self.used[key] = time.time()
+		return decode_outline(row[0])
+
+	def set_outline(self, style_key, glyph_name, stamp, operations, coordinates):
+		self.write(self.get_key(style_key, glyph_name, stamp), 1, sqlite3.Binary(encode_outline(operations, coordinates)))
+
+	def write(self, key, field, value):
+		# hold a width (field 0) or an outline (field 1) until the next batch is written out.
+		with self.lock:
+			entry = self.pending.setdefault(key, [None, None])
+			entry[field] = value
+			self.writes += 1
+			full = len(self.pending) >= WRITE_BATCH
+		if full:
+			self.flush()
+
+	def flush(self):
+		# Write out the pending entries, and which entries were read, in one short transaction.
+		# if the file stays locked by another process for too long, they're dropped.
+		with self.lock:
+			if len(self.pending) == 0 and len(self.used) == 0:
+				return
+			now = time.time()
+			entries = [(key, width, outline, now) for key, (width, outline) in self.pending.items()]
+			used = [(used, key) for key, used in self.used.items()]
+			self.pending = {}
+			self.used = {}
+			try:
+				self.connection.executemany(
+					'INSERT INTO entries (key, width, outline, used) VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+					'width = COALESCE(excluded.width, entries.width), outline = COALESCE(excluded.outline, entries.outline), used = excluded.used',
+					entries)
+				self.connection.executemany('UPDATE entries SET used = ? WHERE key = ?', used)
+				self.connection.commit()
+			except sqlite3.OperationalError:
+				self.connection.rollback()
+				self.failures += 1
+				self.dropped += len(entries)
+
+	def get_size(self):
+		with self.lock:
+			row = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(outline)), 0) FROM entries').fetchone()
+		return row[0] * ENTRY_OVERHEAD + row[1]
+
+	def commit(self):
+		# Write everything out, and evict past the size bound.
+		self.flush()
+		try:
+			if self.get_size() > self.limit:
+				self.evict()
+		except sqlite3.OperationalError:
+			# another process is writing; the next commit evicts instead.
+			with self.lock:
+				self.connection.rollback()
+				self.failures += 1
+
+	def evict(self):
+		# drop the least recently used entries until the cache is back under 90% of its limit.
+		excess = self.get_size() - int(self.limit * 0.9)
+		with self.lock:
+			stale = []
+			for key, size in self.connection.execute('SELECT key, COALESCE(LENGTH(outline), 0) FROM entries ORDER BY used'):
+				if excess <= 0:
+					break
+				stale.append((key,))
+				excess -= size + ENTRY_OVERHEAD
+			self.connection.executemany('DELETE FROM entries WHERE key = ?', stale)
+			self.connection.commit()
+			self.evictions += len(stale)
+
+	def close(self):
+		with self.lock:
+			self.connection.close()
+
+	def reset_counters(self):
+		self.width_hits = 0
+		self.outline_hits = 0
+		self.writes = 0
+		self.evictions = 0
+		self.dropped = 0
+		self.failures = 0
+
+	def report(self):
+		try:
+			size = '%.01f MB cached' % (self.get_size() / (1024.0 * 1024.0))
+		except sqlite3.OperationalError:
+			size = 'size unknown'
+		line = '[disk cache] %d widths and %d outlines read, %d written, %d evicted, %s' % (
+			self.width_hits, self.outline_hits, self.writes, self.evictions, size)
+		if self.failures > 0:
+			line += ' (locked by another process %d times, %d writes dropped)' % (self.failures, self.dropped)
+		return line
@@ -1,15 +1,32 @@
 import os
+import re
 import json
+from concurrent.futures import ThreadPoolExecutor
 from GlyphsApp import Glyphs
 
+from schema import validate_template
+
+TEMPLATE_WORKERS = 8
+
+# Parsed template json by path, along with the (mtime, size) of the file it was parsed
+# from. Kept for the whole session, so reopening the tool only reads templates that changed.
+TEMPLATE_CACHE = {}
+
+# A template whose name is its first key, as the tool saves them, can be listed
+# from the start of its file alone.
+TEMPLATE_NAME = re.compile(r'^\s*\{\s*"name"\s*:\s*("(?:[^"\\]|\\.)*")')
+TEMPLATE_HEAD_SIZE = 4096
+
 
 class OCCTemplatesView:
 
-	def __init__(self, preferences):
+	def __init__(self, preferences, glyphIndex):
 		self.templateFiles = preferences.templatePaths
 		self.debug = bool(preferences.debugMode)
-		self.data = self.parseTemplatePaths(self.templateFiles)
+		# every template is validated against the same index of styles and glyph names.
 		self.instanceList = self.getInstanceList()
+		self.glyphIndex = glyphIndex
+		self.data = self.parseTemplatePaths(self.templateFiles)
 
 	def getInstanceList(self):
 		instances = {}
@@ -26,164 +43,114 @@ class OCCTemplatesView:
 		return instances
 
 	def parseTemplatePaths(self, files):
-		templates = []
-		for i, template_path in enumerate(files):
-			if not os.path.isfile(template_path):
-				print(f"⚠️ [Missing Template] {template_path}\tnot found")
-				continue
-			try:
-				with open(template_path, 'r') as template_file:
-					template = self.parseTemplateFile(template_path, template_file)
-					if template is not None:
-						templates.append(template)
-			except Exception as e:
-				print(f"An error occurred while processing the file {template_path}: {e}")
-		return templates
-
-	def parseTemplateFile(self, name, file):
+		# Only what the templates list shows is read up front, concurrently. A template
+		# is read and validated in full once it's selected, see getTemplate.
+		with ThreadPoolExecutor(max_workers=TEMPLATE_WORKERS) as executor:
+			results = list(executor.map(self.readTemplateEntry, files))
+		entries = []
+		for entry, messages in results:
+			self.printMessages(messages)
+			if entry is not None:
+				entries.append(entry)
+		return entries
+
+	def readTemplateEntry(self, template_path):
+		# An entry for the templates list, or None, along with the messages to print for it.
+		# the full template is only filled in by validateEntry.
+		messages = []
+		if not os.path.isfile(template_path):
+			messages.append(f"⚠️ [Missing Template] {template_path}\tnot found")
+			return None, messages
 		try:
-			if self.debug:
-				print(f'[{name}]\tloading template...')
-			template = json.load(file)
-			result = self.validateAndFormatTemplate(name, template)
-			if self.debug:
-				print(f'[{name}]\tdone loading.\n')
-			return result
-
+			entry = {
+				'name': self.readTemplateName(template_path),
+				'path': template_path,
+				'stamp': None,
+				'template': None
+			}
+			return entry, messages
+		except (IOError, OSError) as e:
+			messages.append(f"An error occurred while processing the file {template_path}: {e}")
 		except Exception as error:
 			if self.debug:
-				print(f'[{name}]\terror parsing this template\'s json:')
-				print(f'[{name}]\t{error}')
-
-			return None
-
-	def validateAndFormatTemplate(self, template_name, template):
-		instances = self.getInstanceList()
-		instance_names = instances.keys()
-
-		if 'name' in template:
-			name = template['name']
-		else:
-			if self.debug:
-				print(f'[{template_name}]\t"{template_name}" does not have a template name specified. Naming it "{template_name}"')
-			name = template_name
-
-		default_style = None
-		default_size = 24
-
-		if 'style' in template:
-			if template['style'] in instance_names:
-				default_style = template['style']
-			else:
-				if self.debug:
-					print(f'[{template_name}]\tthe template specifies a default style ({template["style"]}), but it’s not a style of the current typeface.')
-		else:
-			if self.debug:
-				print(f'[{template_name}]\tthe template does not specify a default style.')
-
-		if 'size' in template:
-			if isinstance(template['size'], int):
-				default_size = template['size']
-			else:
-				if self.debug:
-					print(f'[{template_name}]\tthe proof specifies a default size ({template["size"]}), but it’s not a whole number.')
-		else:
-			if self.debug:
-				print(f'[{template_name}]\tthe template does not specify a default size.')
-
-		glyphs = []
-
-		if 'glyphs' in template:
-			if isinstance(template['glyphs'], list):
-				glyphs = template['glyphs']
-				for g in glyphs:
-					if not Glyphs.font.glyphs[g]:
-						if g != "newGlyph":						
-							glyphs.remove(g)
-							if self.debug:
-								print(f'[{template_name}]\t⚠️{g} does not exist in the current font and will be skipped.')
-			else:
-				if self.debug:
-					print(f'[{template_name}]\tthe template provides a "glyphs" key, but it’s not a list of glyph names.')
-		else:
+				messages.append(f'[{template_path}]\terror parsing this template\'s json:')
+				messages.append(f'[{template_path}]\t{error}')
+		return None, messages
+
+	def readTemplateName(self, template_path):
+		with open(template_path, 'r') as template_file:
+			head = template_file.read(TEMPLATE_HEAD_SIZE)
+		match = TEMPLATE_NAME.match(head)
+		if match is not None:
+			return json.loads(match.group(1))
+		# the name is somewhere further in; fall back on parsing all of it.
+		template = self.readTemplatePath(template_path)
+		return template['name'] if 'name' in template else template_path
+
+	def loadTemplateEntry(self, template_path):
+		# an entry for a template that's about to be selected, validated right away.
+		entry, messages = self.readTemplateEntry(template_path)
+		self.printMessages(messages)
+		if entry is not None and self.validateEntry(entry) is not None:
+			return entry
+		return None
+
+	def getTemplate(self, index):
+		self.glyphIndex.refresh()
+		return self.validateEntry(self.data[index])
+
+	def validateEntry(self, entry):
+		# The full template of a list entry, validated when it's first needed,
+		# and again whenever its file changed since. None if it's not valid.
+		try:
+			stamp = self.getTemplateStamp(entry['path'])
+		except (IOError, OSError):
+			# the file went away; keep whatever we had.
+			return entry['template']
+		if entry['template'] is None or entry['stamp'] != stamp:
+			template, messages = self.loadTemplatePath(entry['path'])
+			self.printMessages(messages)
+			entry['template'] = template
+			entry['stamp'] = stamp
+		return entry['template']
+
+	def loadTemplatePath(self, template_path):
+		# A validated template, or None, along with the messages to print for it.
+		messages = []
+		try:
 			if self.debug:
-				print(f'[{template_name}]\tthe template does not provide a "glyphs" key.')
-
-		if 'lines' in template:
-			lines = []
-			for linenum, line in enumerate(template['lines']):
-				if 'style' not in line:
-					if default_style is not None:
-						line['style'] = default_style
-					else:
-						if self.debug:
-							print(f'[{template_name}]\tline {linenum + 1} has no style specified and no default style is set.')
-						continue
-
-				if len(list(filter(lambda i: i == line['style'], instances))) != 1:
-					if default_style is not None:
-						if self.debug:
-							print(f'[{template_name}]\t⚠️ line {linenum + 1} specifies "{line["style"]}," which is not an instance in this typeface. Replacing with the default "{default_style}".')
-						line['style'] = default_style
-					else:
-						if self.debug:
-							print(f'[{template_name}]\t⚠️ line {linenum + 1} specifies "{line["style"]}," which is not an instance in this typeface. Since no valid default style is specified, we’re skipping the line.')
-						continue
-
-				if 'size' not in line:
-					if self.debug:
-						print(f'[{template_name}]\tline {linenum + 1} has no size specified, setting default of {default_size}.')
-					line['size'] = default_size
-
-				if not isinstance(line['size'], int):
-					if self.debug:
-						print(f'[{template_name}]\tline {linenum + 1} does not specify a whole number size, replacing it with the default ({default_size})...')
-					line['size'] = default_size
-
-				lines.append(line)
-		else:
+				messages.append(f'[{template_path}]\tloading template...')
+			template = self.validateAndFormatTemplate(template_path, self.readTemplatePath(template_path), messages)
 			if self.debug:
-				print(f'[{template_name}]\t"{template_name}" does not have any lines specified.')
-			lines = []
-
-		proof = {
-			"margins": {
-				"left": 20,
-				"right": 70,
-				"top": 20,
-				"bottom": 100,
-			},
-			"gaps": {
-				"line": 20,
-				"block": 20
-			},
-			"mode": "waterfall",
-			"footer": ""
-		}
-
-		if 'proof' in template:
-			if 'margins' in template['proof']:
-				proof['margins']['left'] = template['proof']['margins']['left']
-				proof['margins']['right'] = template['proof']['margins']['right']
-				proof['margins']['top'] = template['proof']['margins']['top']
-				proof['margins']['bottom'] = template['proof']['margins']['bottom']
-
-			if 'gaps' in template['proof']:
-				proof['gaps']['line'] = template['proof']['gaps']['line']
-				proof['gaps']['block'] = template['proof']['gaps']['block']
-
-			if 'mode' in template['proof']:
-				proof['mode'] = template['proof']['mode']
-
-			if 'footer' in template['proof']:
-				proof['footer'] = template['proof']['footer']
-		else:
+				messages.append(f'[{template_path}]\tdone loading.\n')
+			return template, messages
+		except (IOError, OSError) as e:
+			messages.append(f"An error occurred while processing the file {template_path}: {e}")
+		except Exception as error:
 			if self.debug:
-				print(f'[{template_name}]\t"{template_name}" does not specify margin and gap information. Setting defaults.')
-
-		return {
-			"name": name,
-			"lines": lines,
-			"proof": proof,
-			"glyphs": glyphs
-		}
+				messages.append(f'[{template_path}]\terror parsing this template\'s json:')
+				messages.append(f'[{template_path}]\t{error}')
+		return None, messages
+
+	def getTemplateStamp(self, template_path):
+		status = os.stat(template_path)
+		return (status.st_mtime_ns, status.st_size)
+
+	def readTemplatePath(self, template_path):
+		# the template's json, parsed again only if the file changed since it was last read.
+		stamp = self.getTemplateStamp(template_path)
+		cached = TEMPLATE_CACHE.get(template_path)
+		if cached is not None and cached[0] == stamp:
+			return cached[1]
+		with open(template_path, 'r') as template_file:
+			template = json.load(template_file)
+		TEMPLATE_CACHE[template_path] = (stamp, template)
+		return template
+
+	def printMessages(self, messages):
+		for message in messages:
+			print(message)
+
+	def validateAndFormatTemplate(self, template_name, template, messages):
+		# validates without changing `template`, which may be shared through the template cache.
+		return validate_template(template_name, template, self.instanceList.keys(), self.glyphIndex.has_glyph, self.debug, messages)
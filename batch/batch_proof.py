@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# Batch proofing: a set of templates proofed against one font, in parallel.
+#
+# Reads the font with fontTools, and the templates in the same format the tool
+# loads, and writes a proof per template on a pool of worker processes, without
+# Glyphs or a user interface. Workers share widths and outlines through the same
+# disk cache the tool keeps, so later batches on an unchanged font start warm.
+#
+#   python3 batch/batch_proof.py --font Family-VF.ttf --templates templates/*.json
+#   python3 batch/batch_proof.py --font Family-Regular.otf Family-Bold.otf --templates a.json b.json --format svg --jobs 8 --json timings.json
+#
+
+import os
+import sys
+import json
+import argparse
+from timeit import default_timer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ProofingTool.glyphsPlugin', 'Contents', 'Resources')
+sys.path.insert(0, RESOURCES)
+
+from batch import init_worker, proof_template  # noqa: E402
+from renderers import RENDERERS  # noqa: E402
+from store import DEFAULT_DISK_CACHE_LIMIT  # noqa: E402
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~/.cache/ProofingTool'), 'glyphs.sqlite')
+
+
+def describe_outputs(outputs):
+	# a proof written to a single file by its path, and one written a page per file by a glob.
+	if len(outputs) == 0:
+		return 'no files written'
+	if len(outputs) == 1:
+		return outputs[0]
+	root, extension = os.path.splitext(outputs[0])
+	return '%s-*%s (%d files)' % (root.rsplit('-', 1)[0], extension, len(outputs))
+
+
+def print_summary(results, wall_time):
+	print('%-32s %6s %11s %9s %9s %9s %9s' % ('template', 'pages', 'placements', 'metrics', 'layout', 'render', 'total'))
+	for result in results:
+		run = result['run']
+		timings = run['timings']
+		print('%-32s %6d %11d %9.03f %9.03f %9.03f %9.03f' % (
+			os.path.basename(result['template'])[:32],
+			run['counters'].get('pages', 0),
+			run['counters'].get('placements', 0),
+			timings.get('interpolation', 0.0) + timings.get('metrics', 0.0),
+			timings.get('layout', 0.0),
+			timings.get('render', 0.0) + timings.get('paths', 0.0),
+			run['total']))
+	print('%d proofs in %.03f seconds' % (len(results), wall_time))
+
+
+def main(arguments=None):
+	parser = argparse.ArgumentParser(description='Proof a set of templates against a font, in parallel.')
+	parser.add_argument('--font', nargs='+', required=True, help='the font: a variable font, or the static fonts of a family')
+	parser.add_argument('--templates', nargs='+', required=True, help='template .json files, as the tool loads them')
+	parser.add_argument('--output', default='proofs', help='directory to write the proofs to')
+	parser.add_argument('--format', default='pdf', choices=sorted(RENDERERS.keys()) + ['drawbot'], help='pdf and svg run anywhere; drawbot needs DrawBot')
+	parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+	parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help='disk cache shared by the workers')
+	parser.add_argument('--no-cache', action='store_true', help='don’t read or write the disk cache')
+	parser.add_argument('--cache-limit', type=int, default=DEFAULT_DISK_CACHE_LIMIT, help='disk cache size bound, in bytes')
+	parser.add_argument('--fallback', default='.notdef', help='glyph drawn for glyphs a style doesn’t have; empty for a placeholder box')
+	parser.add_argument('--debug', action='store_true', help='print every template validation message')
+	parser.add_argument('--json', help='also write every template’s timings to this file as JSON')
+	options = parser.parse_args(arguments)
+
+	if not os.path.isdir(options.output):
+		os.makedirs(options.output)
+	cache_path = None if options.no_cache else options.cache
+
+	started = default_timer()
+	results = []
+	failures = 0
+	with ProcessPoolExecutor(max_workers=max(1, options.jobs), initializer=init_worker, initargs=(options.font, cache_path, options.cache_limit, options.format)) as executor:
+		futures = dict((executor.submit(proof_template, template_path, options.output, options.fallback, options.debug), template_path) for template_path in options.templates)
+		for future in as_completed(futures):
+			template_path = futures[future]
+			try:
+				result = future.result()
+			except Exception as error:
+				failures += 1
+				print('[%s]\tcouldn’t be proofed: %s' % (template_path, error))
+				continue
+			results.append(result)
+			print('[%s]\t%s' % (template_path, describe_outputs(result['outputs'])))
+			for message in result['messages']:
+				print(message)
+
+	# the summary follows the order the templates were given in.
+	order = dict((template_path, index) for index, template_path in enumerate(options.templates))
+	results.sort(key=lambda result: order[result['template']])
+	print_summary(results, default_timer() - started)
+
+	if options.json:
+		with open(options.json, 'w') as file:
+			json.dump([dict(result['run'], outputs=result['outputs']) for result in results], file, indent=4, default=str)
+	return 1 if failures > 0 else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+#
+# Offline benchmarks for the proofing layouts.
+#
+# Drives OCCProofingWaterfallLayout and OCCProofingParagraphLayout through
+# lightweight stand-ins for the interpolated font proxies in
+# parameters['exports'], so layout performance can be measured on any machine
+# with Python 3, without Glyphs, DrawBot or vanilla.
+#
+#   python3 benchmarks/benchmark_layout.py
+#   python3 benchmarks/benchmark_layout.py --glyphs 100 1000 30000 --styles 1 20 --json bench.json
+#
+
+import os
+import sys
+import json
+import random
+import argparse
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ProofingTool.glyphsPlugin', 'Contents', 'Resources')
+sys.path.insert(0, RESOURCES)
+
+from layout import PROOFING_LAYOUTS  # noqa: E402
+from profiling import OCCProofingProfile  # noqa: E402
+
+# US Letter, landscape, in drawBot points; the same canvas the tool proofs on.
+PAGE_WIDTH = 792.0
+PAGE_HEIGHT = 612.0
+UPM = 1000
+
+DEFAULT_GLYPH_COUNTS = [100, 1000, 5000, 30000]
+DEFAULT_STYLE_COUNTS = [1, 4, 20]
+DEFAULT_MODES = ['waterfall', 'paragraph']
+
+
+#
+# Stand-ins for the GlyphsApp objects the layouts read from:
+# a proxy font with one master, and glyphs with one layer each.
+#
+
+class StubMaster(object):
+	def __init__(self, ascender, descender):
+		self.id = 'master-0'
+		self.ascender = ascender
+		self.descender = descender
+
+
+class StubLayer(object):
+	def __init__(self, parent, width):
+		self.parent = parent
+		self.width = width
+
+
+class StubGlyph(object):
+	def __init__(self, name, master_id=None, width=None):
+		self.name = name
+		self.layers = {}
+		if master_id is not None:
+			self.layers[master_id] = StubLayer(self, width)
+
+
+class StubFont(object):
+	def __init__(self, glyph_names, seed, ascender, descender):
+		widths = random.Random(seed)
+		self.masters = [StubMaster(ascender, descender)]
+		self.glyphs = dict((name, StubGlyph(name, self.masters[0].id, widths.randint(100, 1200))) for name in glyph_names)
+
+
+def make_font(glyph_count, style_count, seed=0):
+	glyph_names = ['glyph%05d' % i for i in range(glyph_count)]
+	exports = {}
+	for style_index in range(style_count):
+		style_name = 'Style %d' % style_index
+		exports[style_name] = StubFont(glyph_names, seed + style_index, 750 + 10 * style_index, -250)
+	return glyph_names, exports
+
+
+def make_glyph_sequence(glyph_names, line_break_every=0):
+	# The proof's glyph list: the whole glyph set, like a full character set proof,
+	# optionally broken into paragraphs with 'newGlyph' linebreaks.
+	sequence = []
+	for i, glyph_name in enumerate(glyph_names):
+		sequence.append(StubGlyph(glyph_name))
+		if line_break_every > 0 and (i + 1) % line_break_every == 0:
+			sequence.append(StubGlyph('newGlyph'))
+	return sequence
+
+
+def make_parameters(exports, mode, point_size):
+	return {
+		'gaps': {'left': 20, 'right': 50, 'top': 20, 'bottom': 50, 'line': 10, 'block': 20},
+		'instances': list(exports.keys()),
+		'exports': exports,
+		'point_sizes': [point_size] * len(exports),
+		'aligned': True,
+		'document': {'width': 11, 'height': 8.5},
+		'title': '',
+		'footer': '',
+		'mode': mode
+	}
+
+
+def run_scenario(glyph_count, style_count, mode, point_size, line_break_every, trace_memory=False):
+	glyph_names, exports = make_font(glyph_count, style_count)
+	glyphs = [make_glyph_sequence(glyph_names, line_break_every)]
+	parameters = make_parameters(exports, mode, point_size)
+
+	profile = OCCProofingProfile(enabled=True, trace_memory=trace_memory)
+	profile.start({'glyph_count': glyph_count, 'style_count': style_count, 'mode': mode, 'point_size': point_size})
+	with profile.stage('layout'):
+		layout = PROOFING_LAYOUTS[mode](glyphs, parameters, PAGE_WIDTH, PAGE_HEIGHT, UPM, profile=profile)
+		pages = layout.get()
+	profile.count('pages', len(pages))
+	profile.count('placements', sum(map(len, pages)))
+	return profile.stop()
+
+
+def main(arguments=None):
+	parser = argparse.ArgumentParser(description='Benchmark the proofing layouts on synthetic fonts.')
+	parser.add_argument('--glyphs', type=int, nargs='+', default=DEFAULT_GLYPH_COUNTS, help='glyph counts to generate fonts with')
+	parser.add_argument('--styles', type=int, nargs='+', default=DEFAULT_STYLE_COUNTS, help='numbers of styles to proof')
+	parser.add_argument('--modes', nargs='+', default=DEFAULT_MODES, choices=sorted(PROOFING_LAYOUTS.keys()))
+	parser.add_argument('--size', type=int, default=24, help='point size of every line')
+	parser.add_argument('--line-break-every', type=int, default=0, help='insert a linebreak after every n glyphs')
+	parser.add_argument('--json', help='also write every run to this file as JSON')
+	options = parser.parse_args(arguments)
+
+	runs = []
+	print('%-10s %8s %7s %8s %11s %9s %12s %10s' % ('mode', 'glyphs', 'styles', 'pages', 'placements', 'seconds', 'us/placement', 'peak MB'))
+	for mode in options.modes:
+		for glyph_count in options.glyphs:
+			for style_count in options.styles:
+				run = run_scenario(glyph_count, style_count, mode, options.size, options.line_break_every)
+				# memory is traced in a pass of its own, since tracing slows down the timed pass.
+				run['peak_memory'] = run_scenario(glyph_count, style_count, mode, options.size, options.line_break_every, trace_memory=True)['peak_memory']
+				runs.append(run)
+				placements = run['counters'].get('placements', 0)
+				print('%-10s %8d %7d %8d %11d %9.03f %12.02f %10.01f' % (
+					mode,
+					glyph_count,
+					style_count,
+					run['counters'].get('pages', 0),
+					placements,
+					run['total'],
+					1000000.0 * run['total'] / max(placements, 1),
+					run['peak_memory'] / (1024.0 * 1024.0)))
+
+	if options.json:
+		with open(options.json, 'w') as file:
+			json.dump(runs, file, indent=4)
+
+
+if __name__ == '__main__':
+	main()